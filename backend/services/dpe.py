@@ -3,10 +3,24 @@ Service DPE - Diagnostic de Performance Énergétique
 Accès aux données ADEME sur les performances énergétiques des bâtiments
 """
 
+import asyncio
+import logging
+import os
+import diskcache
 import httpx
+import ijson
+import orjson
+from collections import Counter
 from typing import Optional, Dict, Any
 from datetime import datetime
 
+from .http_client import get_http_client, get_with_retry, retry_transient
+from .single_flight import latlon_key, single_flight
+from .ttl_cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
 
 class DPEService:
     """
@@ -19,8 +33,84 @@ class DPEService:
     # URL de l'API ADEME
     ADEME_API_URL = "https://data.ademe.fr/data-fair/api/v1/datasets/dpe-v2-logements-existants/lines"
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=20.0)
+    # Champs ADEME demandés (projection "select"): ceux lus par
+    # _format_dpe_response, et ceux agrégés par _get_postal_code_average
+    DPE_FIELDS = ",".join((
+        "classe_consommation_energie",
+        "classe_estimation_ges",
+        "consommation_energie",
+        "estimation_ges",
+        "date_etablissement_dpe",
+        "type_batiment",
+        "annee_construction",
+        "surface_habitable",
+        "type_energie_principale_chauffage"
+    ))
+    AVERAGE_FIELDS = "classe_consommation_energie,classe_estimation_ges,consommation_energie,estimation_ges"
+    
+    # Coefficients d'ajustement du prix par classe DPE
+    CLASSE_COEFFICIENTS = {
+        "A": 1.10,   # +10%
+        "B": 1.05,   # +5%
+        "C": 1.02,   # +2%
+        "D": 1.00,   # Référence
+        "E": 0.97,   # -3%
+        "F": 0.90,   # -10% (passoire)
+        "G": 0.85,   # -15% (passoire)
+    }
+    
+    # Descriptions des classes DPE
+    CLASSE_DESCRIPTIONS = {
+        "A": "Excellent - Très performant énergétiquement",
+        "B": "Très bon - Faible consommation",
+        "C": "Bon - Performance satisfaisante",
+        "D": "Moyen - Consommation standard",
+        "E": "Médiocre - Consommation élevée",
+        "F": "Passoire thermique - Travaux recommandés",
+        "G": "Passoire thermique - Travaux nécessaires",
+    }
+    
+    # Délais des requêtes HTTP (secondes)
+    TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+    
+    # Caches partagés entre instances et requêtes: adresses par coordonnées
+    # arrondies (~11 m), moyennes DPE par code postal
+    _GEOCODE_CACHE = TTLCache(ttl=3600)
+    _POSTCODE_CACHE = TTLCache(ttl=24 * 3600)
+    
+    # Durée de conservation des moyennes par code postal sur disque
+    POSTCODE_DISK_TTL = 7 * 24 * 3600  # secondes
+    
+    # Délai de la recherche par adresse au-delà duquel la moyenne du code
+    # postal est demandée en parallèle
+    FALLBACK_DELAY = 0.5  # secondes
+    
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        cache_dir: Optional[str] = None
+    ):
+        """
+        Initialise le service.
+        
+        Args:
+            client: Client HTTP à utiliser (par défaut le client partagé,
+                    HTTP/2 avec pool de connexions keep-alive)
+            cache_dir: Répertoire du cache disque
+                       (par défaut $CACHE_DIR ou /tmp/estimmo_cache)
+        """
+        self._client = client
+        
+        # Cache disque: survit aux redémarrages du process
+        self.disk_cache = diskcache.Cache(
+            cache_dir or os.environ.get("CACHE_DIR", "/tmp/estimmo_cache"),
+            size_limit=2 << 30
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Client HTTP fourni à l'initialisation, sinon le client partagé."""
+        return self._client or get_http_client()
     
     async def get_dpe(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
         """
@@ -43,23 +133,43 @@ class DPEService:
             if not address_info:
                 return None
             
+            postcode = address_info.get("postcode")
+            
             # Chercher les DPE dans la même rue/quartier
-            dpe_data = await self._search_dpe_by_address(address_info)
+            specific_task = asyncio.ensure_future(self._search_dpe_by_address(address_info))
+            done, _ = await asyncio.wait({specific_task}, timeout=self.FALLBACK_DELAY)
+            
+            # Recherche lente: moyenne du code postal lancée par anticipation.
+            # Coût: une requête ADEME (size=100) en plus, mise en cache, même
+            # si le DPE précis est finalement trouvé
+            average_task = None
+            if not done:
+                average_task = asyncio.ensure_future(self._get_postal_code_average(postcode))
+            
+            dpe_data = await specific_task
             
             if dpe_data:
                 return self._format_dpe_response(dpe_data)
             
             # Fallback: moyenne du code postal
-            return await self._get_postal_code_average(address_info.get("postcode"))
+            if average_task is None:
+                return await self._get_postal_code_average(postcode)
+            return await average_task
             
         except Exception as e:
-            print(f"Erreur DPE: {e}")
+            logger.exception("Erreur DPE: %s", e)
             return None
     
+    @single_flight(latlon_key)
     async def _reverse_geocode(self, lat: float, lon: float) -> Optional[Dict]:
         """
         Convertit des coordonnées en adresse via l'API adresse.data.gouv.fr
         """
+        key = (round(lat, 4), round(lon, 4))
+        cached = self._GEOCODE_CACHE.get(key)
+        if cached is not None:
+            return dict(cached)
+        
         try:
             url = "https://api-adresse.data.gouv.fr/reverse/"
             params = {
@@ -67,64 +177,69 @@ class DPEService:
                 "lon": lon
             }
             
-            response = await self.client.get(url, params=params)
+            response = await get_with_retry(self.client, url, params=params, timeout=self.TIMEOUT)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if data.get("features"):
                     props = data["features"][0]["properties"]
-                    return {
+                    address_info = {
                         "housenumber": props.get("housenumber"),
                         "street": props.get("street"),
                         "postcode": props.get("postcode"),
                         "city": props.get("city"),
                         "citycode": props.get("citycode")
                     }
+                    self._GEOCODE_CACHE.set(key, address_info)
+                    return dict(address_info)
             
             return None
             
         except Exception as e:
-            print(f"Erreur reverse geocode: {e}")
+            logger.warning("Erreur reverse geocode: %s", e)
             return None
     
+    # La requête ne dépend que du code postal (et du service)
+    @single_flight(lambda self, address_info: (id(self), address_info.get("postcode")))
     async def _search_dpe_by_address(self, address_info: Dict) -> Optional[Dict]:
         """
         Recherche un DPE correspondant à une adresse.
         """
         try:
-            # Construction de la requête API ADEME
+            # Construction de la requête API ADEME: seul le DPE le plus
+            # récent est utile, trié côté serveur
             params = {
-                "size": 10,
-                "q_mode": "simple"
+                "size": 1,
+                "sort": "-date_etablissement_dpe",
+                "select": self.DPE_FIELDS
             }
             
             # Filtrer par code postal et ville
             if address_info.get("postcode"):
                 params["qs"] = f"code_postal:{address_info['postcode']}"
             
-            response = await self.client.get(
+            response = await get_with_retry(
+                self.client,
                 self.ADEME_API_URL,
-                params=params
+                params=params,
+                timeout=self.TIMEOUT
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 results = data.get("results", [])
                 
                 if results:
                     # Retourner le DPE le plus récent
-                    return max(
-                        results,
-                        key=lambda x: x.get("date_etablissement_dpe", ""),
-                        default=None
-                    )
+                    return results[0]
             
             return None
             
         except Exception as e:
-            print(f"Erreur recherche DPE: {e}")
+            logger.warning("Erreur recherche DPE: %s", e)
             return None
     
+    @single_flight(lambda self, postcode: (id(self), postcode))
     async def _get_postal_code_average(self, postcode: Optional[str]) -> Optional[Dict]:
         """
         Calcule une moyenne des DPE pour un code postal donné.
@@ -133,53 +248,113 @@ class DPEService:
         if not postcode:
             return None
         
+        cached = self._POSTCODE_CACHE.get(postcode)
+        if cached is None:
+            cached = self.disk_cache.get(f"dpe_cp:{postcode}")
+            if cached is not None:
+                self._POSTCODE_CACHE.set(postcode, cached)
+        if cached is not None:
+            return dict(cached)
+        
         try:
-            params = {
-                "size": 100,
-                "qs": f"code_postal:{postcode}",
-                "select": "classe_consommation_energie,classe_estimation_ges,consommation_energie,estimation_ges"
-            }
-            
-            response = await self.client.get(
-                self.ADEME_API_URL,
-                params=params
-            )
+            average = await self._fetch_postal_code_average(postcode)
             
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", [])
-                
-                if results:
-                    # Calculer les moyennes
-                    energies = [r.get("consommation_energie", 0) for r in results if r.get("consommation_energie")]
-                    ges_values = [r.get("estimation_ges", 0) for r in results if r.get("estimation_ges")]
-                    
-                    # Classe la plus fréquente
-                    classes = [r.get("classe_consommation_energie") for r in results if r.get("classe_consommation_energie")]
-                    classe_freq = max(set(classes), key=classes.count) if classes else "D"
-                    
-                    classes_ges = [r.get("classe_estimation_ges") for r in results if r.get("classe_estimation_ges")]
-                    classe_ges_freq = max(set(classes_ges), key=classes_ges.count) if classes_ges else "D"
-                    
-                    return {
-                        "classe_energie": classe_freq,
-                        "classe_ges": classe_ges_freq,
-                        "consommation_energie": sum(energies) / len(energies) if energies else None,
-                        "estimation_ges": sum(ges_values) / len(ges_values) if ges_values else None,
-                        "source": f"Moyenne {len(results)} DPE - CP {postcode}",
-                        "is_average": True
-                    }
+            if average is not None:
+                self._POSTCODE_CACHE.set(postcode, average)
+                self.disk_cache.set(f"dpe_cp:{postcode}", average, expire=self.POSTCODE_DISK_TTL)
+                return dict(average)
             
             return None
             
         except Exception as e:
-            print(f"Erreur moyenne CP: {e}")
+            logger.warning("Erreur moyenne CP: %s", e)
+            return None
+    
+    @retry_transient
+    async def _fetch_postal_code_average(self, postcode: str) -> Optional[Dict]:
+        """
+        Interroge ADEME et agrège les DPE du code postal (None si aucun).
+        Les erreurs réseau transitoires sont retentées (agrégats remis à zéro).
+        """
+        params = {
+            "size": 100,
+            "qs": f"code_postal:{postcode}",
+            "select": self.AVERAGE_FIELDS
+        }
+        
+        # Réponse lue en streaming: valeurs et classes cumulées au fil
+        # des résultats, sans construire la liste complète
+        nb_results = 0
+        energie_total = 0.0
+        nb_energies = 0
+        ges_total = 0.0
+        nb_ges = 0
+        classes = Counter()
+        classes_ges = Counter()
+        
+        async with self.client.stream(
+            "GET",
+            self.ADEME_API_URL,
+            params=params,
+            timeout=self.TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                return None
+            
+            results = ijson.sendable_list()
+            parser = ijson.items_coro(results, "results.item", use_float=True)
+            async for chunk in response.aiter_bytes():
+                parser.send(chunk)
+                for r in results:
+                    nb_results += 1
+                    energie = r.get("consommation_energie")
+                    if energie:
+                        energie_total += energie
+                        nb_energies += 1
+                    ges = r.get("estimation_ges")
+                    if ges:
+                        ges_total += ges
+                        nb_ges += 1
+                    classe = r.get("classe_consommation_energie")
+                    if classe:
+                        classes[classe] += 1
+                    classe_ges = r.get("classe_estimation_ges")
+                    if classe_ges:
+                        classes_ges[classe_ges] += 1
+                del results[:]
+            parser.close()
+        
+        if not nb_results:
             return None
+        
+        # Classe la plus fréquente
+        classe_freq = classes.most_common(1)[0][0] if classes else "D"
+        classe_ges_freq = classes_ges.most_common(1)[0][0] if classes_ges else "D"
+        
+        return {
+            "classe_energie": classe_freq,
+            "classe_ges": classe_ges_freq,
+            "consommation_energie": energie_total / nb_energies if nb_energies else None,
+            "estimation_ges": ges_total / nb_ges if nb_ges else None,
+            "source": f"Moyenne {nb_results} DPE - CP {postcode}",
+            "is_average": True
+        }
     
-    def _format_dpe_response(self, dpe_data: Dict) -> Dict[str, Any]:
+    def _format_dpe_response(
+        self,
+        dpe_data: Dict,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         Formate les données DPE brutes en réponse standardisée.
+        
+        Args:
+            dpe_data: Données DPE brutes (ADEME)
+            now: Horodatage de la requête (par défaut datetime.now())
         """
+        if now is None:
+            now = datetime.now()
+        
         return {
             "classe_energie": dpe_data.get("classe_consommation_energie"),
             "classe_ges": dpe_data.get("classe_estimation_ges"),
@@ -192,7 +367,7 @@ class DPEService:
             "type_energie_chauffage": dpe_data.get("type_energie_principale_chauffage"),
             "source": "ADEME DPE",
             "is_average": False,
-            "date_requete": datetime.now().isoformat()
+            "date_requete": now.isoformat()
         }
     
     def get_classe_coefficient(self, classe: Optional[str]) -> float:
@@ -202,34 +377,16 @@ class DPEService:
         Les passoires thermiques (F, G) décotent le bien,
         les bons DPE (A, B) le valorisent.
         """
-        coefficients = {
-            "A": 1.10,   # +10%
-            "B": 1.05,   # +5%
-            "C": 1.02,   # +2%
-            "D": 1.00,   # Référence
-            "E": 0.97,   # -3%
-            "F": 0.90,   # -10% (passoire)
-            "G": 0.85,   # -15% (passoire)
-        }
-        
-        return coefficients.get(classe, 1.0)
+        return self.CLASSE_COEFFICIENTS.get(classe, 1.0)
     
     def get_classe_description(self, classe: Optional[str]) -> str:
         """
         Retourne une description textuelle de la classe DPE.
         """
-        descriptions = {
-            "A": "Excellent - Très performant énergétiquement",
-            "B": "Très bon - Faible consommation",
-            "C": "Bon - Performance satisfaisante",
-            "D": "Moyen - Consommation standard",
-            "E": "Médiocre - Consommation élevée",
-            "F": "Passoire thermique - Travaux recommandés",
-            "G": "Passoire thermique - Travaux nécessaires",
-        }
-        
-        return descriptions.get(classe, "Non évalué")
+        return self.CLASSE_DESCRIPTIONS.get(classe, "Non évalué")
     
     async def close(self):
-        """Ferme le client HTTP"""
-        await self.client.aclose()
+        """Ferme le client HTTP (sauf le client partagé, fermé à l'arrêt de l'application)"""
+        if self._client is not None:
+            await self._client.aclose()
+        self.disk_cache.close()
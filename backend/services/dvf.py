@@ -3,10 +3,73 @@ Service DVF - Demandes de Valeurs Foncières
 Accès aux données de transactions immobilières françaises
 """
 
+import asyncio
+import logging
+import os
+import re
+import diskcache
 import httpx
+import orjson
+from functools import lru_cache
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
-import statistics
+import numpy as np
+
+from .http_client import get_http_client, get_with_retry
+from .single_flight import latlon_key, single_flight
+from .ttl_cache import TTLCache
+
+try:
+    from numba import njit
+except ImportError:  # Numba optionnel: repli sur NumPy
+    njit = None
+
+
+logger = logging.getLogger(__name__)
+
+
+if njit is not None:
+    @njit(
+        "float64(float64, float64, float64[::1], float64[::1], float64[::1], float64[::1], float64[::1], float64)",
+        cache=True
+    )
+    def _default_price_kernel(lat, lon, lat_min, lat_max, lon_min, lon_max, prix, default):
+        """Prix de la première zone contenant le point (code natif, compilé à l'import)."""
+        for i in range(prix.shape[0]):
+            if lat_min[i] <= lat <= lat_max[i] and lon_min[i] <= lon <= lon_max[i]:
+                return prix[i]
+        return default
+else:
+    _default_price_kernel = None
+
+
+# Date au format français (JJ/MM/AAAA)
+_FR_DATE = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(date_str: str) -> datetime:
+    """
+    Parse la partie date (10 premiers caractères) d'une date DVF:
+    ISO (AAAA-MM-JJ, avec ou sans heure) ou française (JJ/MM/AAAA).
+    Les mêmes dates reviennent souvent: résultat mémorisé.
+    """
+    date_part = date_str[:10]
+    
+    try:
+        return datetime.fromisoformat(date_part)
+    except ValueError:
+        pass
+    
+    match = _FR_DATE.fullmatch(date_part)
+    if match:
+        day, month, year = map(int, match.groups())
+        try:
+            return datetime(year, month, day)
+        except ValueError:
+            pass
+    
+    return datetime.min
 
 
 class DVFService:
@@ -24,8 +87,63 @@ class DVFService:
     DVF_ETALAB_URL = "https://app.dvf.etalab.gouv.fr/api"
     GEO_API_URL = "https://geo.api.gouv.fr"
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    # Délais des requêtes HTTP (secondes)
+    TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+    
+    # Prix par défaut (€/m²) par zone géographique, du plus spécifique au
+    # plus large: (lat_min, lat_max, lon_min, lon_max, prix)
+    _REGIONS = (
+        (48.8, 48.95, 2.2, 2.5, 10500),   # Paris et petite couronne
+        (48.5, 49.2, 1.8, 3.0, 4500),     # Grande couronne parisienne
+        (45.7, 45.8, 4.8, 4.9, 5000),     # Lyon
+        (43.2, 43.4, 5.3, 5.5, 3500),     # Marseille
+        (44.8, 44.9, -0.6, -0.5, 4500),   # Bordeaux
+        (43.5, 43.8, 6.8, 7.5, 6000),     # Côte d'Azur
+        (43.0, 50.0, -2.0, 8.0, 3000),    # Autres grandes villes
+    )
+    
+    # Mêmes zones, une colonne contiguë par champ (comparaisons vectorisées)
+    REGION_LAT_MIN, REGION_LAT_MAX, REGION_LON_MIN, REGION_LON_MAX, REGION_PRIX = (
+        np.array(column, dtype=np.float64) for column in zip(*_REGIONS)
+    )
+    DEFAULT_PRICE = 1800.0  # France rurale
+    
+    # Cache partagé des codes commune (coordonnées arrondies à ~11 m)
+    _COMMUNE_CACHE = TTLCache(ttl=3600)
+    
+    # Durée de conservation des codes commune sur disque (codes INSEE stables)
+    COMMUNE_DISK_TTL = 30 * 24 * 3600  # secondes
+    
+    # Délai de réponse de CQuest au-delà duquel le code commune des
+    # fallbacks est récupéré en parallèle
+    FALLBACK_DELAY = 0.5  # secondes
+    
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        cache_dir: Optional[str] = None
+    ):
+        """
+        Initialise le service.
+        
+        Args:
+            client: Client HTTP à utiliser (par défaut le client partagé,
+                    HTTP/2 avec pool de connexions keep-alive)
+            cache_dir: Répertoire du cache disque
+                       (par défaut $CACHE_DIR ou /tmp/estimmo_cache)
+        """
+        self._client = client
+        
+        # Cache disque: survit aux redémarrages du process
+        self.disk_cache = diskcache.Cache(
+            cache_dir or os.environ.get("CACHE_DIR", "/tmp/estimmo_cache"),
+            size_limit=2 << 30
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Client HTTP fourni à l'initialisation, sinon le client partagé."""
+        return self._client or get_http_client()
     
     async def get_stats(
         self, 
@@ -46,73 +164,119 @@ class DVFService:
         Returns:
             Statistiques DVF avec prix moyens, médians, etc.
         """
+        # Horodatage unique de la requête (filtre par date et date_requete)
+        now = datetime.now()
+        
+        # Code commune (utilisé par les fallbacks): récupéré à la demande,
+        # ou par anticipation si CQuest tarde à répondre
+        commune_task = None
+        
+        def commune_code() -> asyncio.Future:
+            nonlocal commune_task
+            if commune_task is None:
+                commune_task = asyncio.ensure_future(self._get_commune_code(lat, lon))
+            return commune_task
+        
         try:
             # Essayer d'abord l'API CQuest (plus fiable)
-            transactions = await self._fetch_cquest(lat, lon, radius_meters)
+            cquest_task = asyncio.ensure_future(self._fetch_cquest(lat, lon, radius_meters))
+            done, _ = await asyncio.wait({cquest_task}, timeout=self.FALLBACK_DELAY)
+            if not done:
+                # Coût: un appel geo.api en plus (résultat mis en cache),
+                # même si CQuest répond finalement
+                commune_code()
+            transactions = await cquest_task
             
             if not transactions:
                 # Fallback sur l'API Etalab
-                transactions = await self._fetch_etalab(lat, lon)
+                transactions = await self._fetch_etalab(lat, lon, await commune_code())
             
             if not transactions:
                 # Dernier recours: données agrégées par commune
-                return await self._get_commune_stats(lat, lon)
+                return await self._get_commune_stats(lat, lon, await commune_code(), now)
             
-            # Filtrer par date
-            date_limite = datetime.now() - timedelta(days=months * 30)
-            transactions_recentes = [
-                t for t in transactions 
-                if self._parse_date(t.get("date_mutation")) >= date_limite
-            ]
+            # Filtrer par date: conversion groupée en datetime64 (dates ISO,
+            # absentes = NaT), repli sur _parse_date pour les autres formats
+            date_limite = now - timedelta(days=months * 30)
+            try:
+                dates = np.array(
+                    [(t.get("date_mutation") or "")[:10] for t in transactions],
+                    dtype="datetime64[D]"
+                )
+                recentes = dates.astype("datetime64[us]") >= np.datetime64(date_limite)
+                transactions_recentes = [t for t, recente in zip(transactions, recentes) if recente]
+            except ValueError:
+                transactions_recentes = [
+                    t for t in transactions 
+                    if self._parse_date(t.get("date_mutation")) >= date_limite
+                ]
             
             if not transactions_recentes:
                 transactions_recentes = transactions[:20]  # Garder les 20 dernières
             
-            # Calculer les prix au m²
-            prix_m2_list = []
-            transactions_detail = []
-            
+            # Filtre cohérence: prix et surface numériques, surface > 10 m².
+            # Les autres transactions sont écartées avant tout calcul (pas de
+            # conversion des chaînes, pas de valeurs remplacées par 0)
+            retenues = []
+            prix_raw = []
+            surface_raw = []
             for t in transactions_recentes:
                 prix = t.get("valeur_fonciere") or t.get("prix")
                 surface = t.get("surface_reelle_bati") or t.get("surface_bati") or t.get("surface")
-                
-                if prix and surface and surface > 10:  # Filtre cohérence
-                    prix_m2 = prix / surface
-                    
-                    # Filtre valeurs aberrantes (< 500€/m² ou > 20000€/m²)
-                    if 500 <= prix_m2 <= 20000:
-                        prix_m2_list.append(prix_m2)
-                        transactions_detail.append({
-                            "date": t.get("date_mutation"),
-                            "prix": prix,
-                            "surface": surface,
-                            "prix_m2": round(prix_m2, 2),
-                            "type": t.get("type_local", "Inconnu"),
-                            "adresse": t.get("adresse") or f"{t.get('numero_voie', '')} {t.get('type_voie', '')} {t.get('voie', '')}"
-                        })
+                if (
+                    isinstance(prix, (int, float)) and prix
+                    and isinstance(surface, (int, float)) and surface > 10
+                ):
+                    retenues.append(t)
+                    prix_raw.append(prix)
+                    surface_raw.append(surface)
+            
+            # Prix au m² (vectorisé)
+            prix_m2_all = (
+                np.array(prix_raw, dtype=np.float64)
+                / np.array(surface_raw, dtype=np.float64)
+            )
             
-            if not prix_m2_list:
-                return await self._get_commune_stats(lat, lon)
+            # Filtre valeurs aberrantes (< 500€/m² ou > 20000€/m²)
+            valid = (prix_m2_all >= 500) & (prix_m2_all <= 20000)
+            prix_m2_list = prix_m2_all[valid]
+            
+            if not prix_m2_list.size:
+                return await self._get_commune_stats(lat, lon, await commune_code(), now)
+            
+            # Détail des 10 premières transactions retenues
+            transactions_detail = []
+            for i in np.flatnonzero(valid)[:10]:
+                t = retenues[i]
+                transactions_detail.append({
+                    "date": t.get("date_mutation"),
+                    "prix": prix_raw[i],
+                    "surface": surface_raw[i],
+                    "prix_m2": round(float(prix_m2_all[i]), 2),
+                    "type": t.get("type_local", "Inconnu"),
+                    "adresse": t.get("adresse") or f"{t.get('numero_voie', '')} {t.get('type_voie', '')} {t.get('voie', '')}"
+                })
             
             # Calculer les statistiques
             return {
-                "prix_m2_moyen": round(statistics.mean(prix_m2_list), 2),
-                "prix_m2_median": round(statistics.median(prix_m2_list), 2),
-                "prix_m2_min": round(min(prix_m2_list), 2),
-                "prix_m2_max": round(max(prix_m2_list), 2),
-                "ecart_type": round(statistics.stdev(prix_m2_list), 2) if len(prix_m2_list) > 1 else 0,
-                "nb_transactions": len(prix_m2_list),
+                "prix_m2_moyen": round(float(prix_m2_list.mean()), 2),
+                "prix_m2_median": round(float(np.median(prix_m2_list)), 2),
+                "prix_m2_min": round(float(prix_m2_list.min()), 2),
+                "prix_m2_max": round(float(prix_m2_list.max()), 2),
+                "ecart_type": round(float(prix_m2_list.std(ddof=1)), 2) if prix_m2_list.size > 1 else 0,
+                "nb_transactions": int(prix_m2_list.size),
                 "periode": f"Derniers {months} mois",
                 "rayon_recherche": radius_meters,
-                "transactions_detail": transactions_detail[:10],  # Top 10
+                "transactions_detail": transactions_detail,
                 "source": "DVF Etalab",
-                "date_requete": datetime.now().isoformat()
+                "date_requete": now.isoformat()
             }
             
         except Exception as e:
-            print(f"Erreur DVF: {e}")
-            return await self._get_commune_stats(lat, lon)
+            logger.exception("Erreur DVF: %s", e)
+            return await self._get_commune_stats(lat, lon, await commune_code(), now)
     
+    @single_flight(latlon_key)
     async def _fetch_cquest(self, lat: float, lon: float, radius: int) -> List[Dict]:
         """
         Récupère les transactions via l'API CQuest.
@@ -124,15 +288,17 @@ class DVFService:
                 "dist": radius
             }
             
-            response = await self.client.get(
+            response = await get_with_retry(
+                self.client,
                 self.DVF_CQUEST_URL,
-                params=params
+                params=params,
+                timeout=self.TIMEOUT
             )
             
             if response.status_code != 200:
                 return []
             
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Format GeoJSON
             if "features" in data:
@@ -141,16 +307,22 @@ class DVFService:
             return data if isinstance(data, list) else []
             
         except Exception as e:
-            print(f"Erreur CQuest: {e}")
+            logger.warning("Erreur CQuest: %s", e)
             return []
     
-    async def _fetch_etalab(self, lat: float, lon: float) -> List[Dict]:
+    async def _fetch_etalab(
+        self,
+        lat: float,
+        lon: float,
+        commune: Optional[str] = None
+    ) -> List[Dict]:
         """
         Récupère via l'API Etalab (backup).
         """
         try:
-            # D'abord trouver le code commune
-            commune = await self._get_commune_code(lat, lon)
+            # D'abord trouver le code commune (si non fourni)
+            if commune is None:
+                commune = await self._get_commune_code(lat, lon)
             if not commune:
                 return []
             
@@ -160,13 +332,23 @@ class DVFService:
             return []
             
         except Exception as e:
-            print(f"Erreur Etalab: {e}")
+            logger.warning("Erreur Etalab: %s", e)
             return []
     
+    @single_flight(latlon_key)
     async def _get_commune_code(self, lat: float, lon: float) -> Optional[str]:
         """
         Récupère le code INSEE de la commune à partir des coordonnées.
         """
+        key = (round(lat, 4), round(lon, 4))
+        cached = self._COMMUNE_CACHE.get(key)
+        if cached is None:
+            cached = self.disk_cache.get(f"commune:{key[0]}:{key[1]}")
+            if cached is not None:
+                self._COMMUNE_CACHE.set(key, cached)
+        if cached is not None:
+            return cached
+        
         try:
             params = {
                 "lat": lat,
@@ -174,31 +356,51 @@ class DVFService:
                 "fields": "code,nom,codesPostaux"
             }
             
-            response = await self.client.get(
+            response = await get_with_retry(
+                self.client,
                 f"{self.GEO_API_URL}/communes",
-                params=params
+                params=params,
+                timeout=self.TIMEOUT
             )
             
             if response.status_code == 200:
-                communes = response.json()
+                communes = orjson.loads(response.content)
                 if communes:
-                    return communes[0].get("code")
+                    code = communes[0].get("code")
+                    if code:
+                        self._COMMUNE_CACHE.set(key, code)
+                        self.disk_cache.set(f"commune:{key[0]}:{key[1]}", code, expire=self.COMMUNE_DISK_TTL)
+                    return code
             
             return None
             
         except Exception as e:
-            print(f"Erreur géo API: {e}")
+            logger.warning("Erreur géo API: %s", e)
             return None
     
-    async def _get_commune_stats(self, lat: float, lon: float) -> Dict[str, Any]:
+    async def _get_commune_stats(
+        self,
+        lat: float,
+        lon: float,
+        commune_code: Optional[str] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         Fallback: récupère des statistiques moyennes de la commune.
         Utilise les données agrégées quand les transactions précises
         ne sont pas disponibles.
+        
+        Args:
+            commune_code: Code INSEE déjà connu (sinon récupéré)
+            now: Horodatage de la requête (par défaut datetime.now())
         """
+        if now is None:
+            now = datetime.now()
+        
         try:
-            # Récupérer info commune
-            commune_code = await self._get_commune_code(lat, lon)
+            # Récupérer info commune (si non fournie)
+            if commune_code is None:
+                commune_code = await self._get_commune_code(lat, lon)
             
             # Prix moyens par défaut selon le type de zone
             # (Ces valeurs sont des estimations nationales moyennes 2024)
@@ -215,54 +417,47 @@ class DVFService:
                 "rayon_recherche": 0,
                 "transactions_detail": [],
                 "source": "Estimation régionale (données DVF indisponibles)",
-                "date_requete": datetime.now().isoformat(),
+                "date_requete": now.isoformat(),
                 "avertissement": "Prix basé sur les moyennes régionales - précision limitée"
             }
             
         except Exception as e:
-            print(f"Erreur stats commune: {e}")
-            return self._get_fallback_stats()
+            logger.warning("Erreur stats commune: %s", e)
+            return self._get_fallback_stats(now)
     
     def _estimate_default_price(self, lat: float, lon: float) -> float:
         """
         Estime un prix par défaut basé sur la localisation géographique.
         Utilise une carte simplifiée des prix en France.
         """
-        # Paris et petite couronne
-        if 48.8 <= lat <= 48.95 and 2.2 <= lon <= 2.5:
-            return 10500
-        
-        # Grande couronne parisienne
-        if 48.5 <= lat <= 49.2 and 1.8 <= lon <= 3.0:
-            return 4500
-        
-        # Lyon
-        if 45.7 <= lat <= 45.8 and 4.8 <= lon <= 4.9:
-            return 5000
-        
-        # Marseille
-        if 43.2 <= lat <= 43.4 and 5.3 <= lon <= 5.5:
-            return 3500
-        
-        # Bordeaux
-        if 44.8 <= lat <= 44.9 and -0.6 <= lon <= -0.5:
-            return 4500
-        
-        # Côte d'Azur
-        if 43.5 <= lat <= 43.8 and 6.8 <= lon <= 7.5:
-            return 6000
+        if _default_price_kernel is not None:
+            return _default_price_kernel(
+                lat, lon,
+                self.REGION_LAT_MIN, self.REGION_LAT_MAX,
+                self.REGION_LON_MIN, self.REGION_LON_MAX,
+                self.REGION_PRIX, self.DEFAULT_PRICE
+            )
         
-        # Autres grandes villes
-        if 43.0 <= lat <= 50.0 and -2.0 <= lon <= 8.0:
-            return 3000
+        # Première zone contenant le point (dans l'ordre de _REGIONS)
+        hits = (
+            (self.REGION_LAT_MIN <= lat) & (lat <= self.REGION_LAT_MAX)
+            & (self.REGION_LON_MIN <= lon) & (lon <= self.REGION_LON_MAX)
+        )
+        idx = hits.argmax()
         
-        # France rurale
-        return 1800
+        # France rurale si aucune zone ne correspond
+        return float(self.REGION_PRIX[idx]) if hits[idx] else self.DEFAULT_PRICE
     
-    def _get_fallback_stats(self) -> Dict[str, Any]:
+    def _get_fallback_stats(self, now: Optional[datetime] = None) -> Dict[str, Any]:
         """
         Statistiques de fallback quand tout échoue.
+        
+        Args:
+            now: Horodatage de la requête (par défaut datetime.now())
         """
+        if now is None:
+            now = datetime.now()
+        
         return {
             "prix_m2_moyen": 3000,
             "prix_m2_median": 2800,
@@ -274,7 +469,7 @@ class DVFService:
             "rayon_recherche": 0,
             "transactions_detail": [],
             "source": "Estimation nationale moyenne",
-            "date_requete": datetime.now().isoformat(),
+            "date_requete": now.isoformat(),
             "avertissement": "Aucune donnée DVF disponible - estimation très approximative"
         }
     
@@ -285,20 +480,7 @@ class DVFService:
         if not date_str:
             return datetime.min
         
-        formats = [
-            "%Y-%m-%d",
-            "%d/%m/%Y",
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%d %H:%M:%S"
-        ]
-        
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str[:10], fmt[:len(date_str[:10])])
-            except ValueError:
-                continue
-        
-        return datetime.min
+        return _parse_date_str(date_str)
     
     async def get_evolution(
         self, 
@@ -311,28 +493,30 @@ class DVFService:
         Utile pour les graphiques de tendance.
         """
         try:
-            evolutions = []
+            now = datetime.now()
+            annees = [(now - timedelta(days=365 * year_offset)).year for year_offset in range(years)]
+            
+            # Récupérer les stats de chaque période, en parallèle
+            # (Simplifié - en production, requête avec filtre date)
+            all_stats = await asyncio.gather(
+                *(self.get_stats(lat, lon, 500, 12) for _ in annees)
+            )
             
-            for year_offset in range(years):
-                date_debut = datetime.now() - timedelta(days=365 * (year_offset + 1))
-                date_fin = datetime.now() - timedelta(days=365 * year_offset)
-                
-                # Récupérer les stats pour cette période
-                # (Simplifié - en production, requête avec filtre date)
-                stats = await self.get_stats(lat, lon, 500, 12)
-                
-                evolutions.append({
-                    "annee": date_fin.year,
+            return [
+                {
+                    "annee": annee,
                     "prix_m2_moyen": stats["prix_m2_moyen"],
                     "nb_transactions": stats["nb_transactions"]
-                })
-            
-            return evolutions
+                }
+                for annee, stats in zip(annees, all_stats)
+            ]
             
         except Exception as e:
-            print(f"Erreur évolution: {e}")
+            logger.warning("Erreur évolution: %s", e)
             return []
     
     async def close(self):
-        """Ferme le client HTTP"""
-        await self.client.aclose()
+        """Ferme le client HTTP (sauf le client partagé, fermé à l'arrêt de l'application)"""
+        if self._client is not None:
+            await self._client.aclose()
+        self.disk_cache.close()
@@ -0,0 +1,64 @@
+"""
+Client HTTP partagé - Pool de connexions HTTP/2 keep-alive, reprises sur erreur réseau
+Utilisé par les services DPE et DVF (ADEME, API Adresse, CQuest, API Géo)
+"""
+
+from typing import Optional
+
+import httpx
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter
+)
+
+
+# Client unique pour tout le process: les connexions (TCP + TLS) vers les
+# quelques hôtes interrogés sont réutilisées d'une requête à l'autre.
+# Créé au premier usage, et recréé s'il a été fermé (redémarrage de
+# l'application dans le même process)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Client HTTP partagé (HTTP/2, pool de connexions keep-alive)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(20.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            headers={"User-Agent": "estimmo-ai/1.0"}
+        )
+    return _http_client
+
+
+# Erreurs réseau transitoires (connexion refusée/réinitialisée, délai de
+# connexion, protocole): jusqu'à 3 tentatives avec attente exponentielle
+# aléatoire. Les délais de lecture et d'attente du pool ne sont pas retentés:
+# chaque tentative pourrait à nouveau durer tout le timeout de la requête
+retry_transient = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(multiplier=0.1, max=1.0),
+    retry=retry_if_exception_type((
+        httpx.NetworkError,
+        httpx.ConnectTimeout,
+        httpx.RemoteProtocolError
+    )),
+    reraise=True
+)
+
+
+@retry_transient
+async def get_with_retry(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """Requête GET retentée en cas d'erreur réseau transitoire."""
+    return await client.get(url, **kwargs)
+
+
+async def close_http_client():
+    """Ferme le client HTTP partagé (arrêt de l'application)."""
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,48 @@
+"""
+Regroupement des appels concurrents (single-flight)
+Un seul appel externe en cours par clé: les appelants suivants partagent son résultat
+"""
+
+import asyncio
+import functools
+from typing import Callable, Dict, Hashable
+
+
+def single_flight(key_func: Callable[..., Hashable]):
+    """
+    Décorateur pour coroutines: tant qu'un appel est en cours pour une clé,
+    les appels concurrents de même clé attendent son résultat au lieu de
+    relancer la requête.
+
+    Le résultat est partagé entre les appelants: il ne doit pas être modifié.
+
+    Args:
+        key_func: Calcule la clé à partir des arguments de l'appel
+    """
+    def decorator(func):
+        inflight: Dict[Hashable, asyncio.Future] = {}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            task = inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                inflight[key] = task
+                task.add_done_callback(lambda _: inflight.pop(key, None))
+
+            # shield: l'annulation d'un appelant n'interrompt pas les autres
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
+
+
+def latlon_key(self, lat: float, lon: float, *args, **kwargs) -> tuple:
+    """
+    Clé de coordonnées arrondies (~11 m) pour les méthodes (self, lat, lon, ...).
+    Propre à l'instance: des services configurés différemment (client,
+    délais) ne partagent pas leurs appels.
+    """
+    return (id(self), round(lat, 4), round(lon, 4)) + args + tuple(sorted(kwargs.items()))
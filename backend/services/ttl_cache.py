@@ -0,0 +1,48 @@
+"""
+Cache mémoire à durée de vie limitée (TTL)
+Partagé entre les requêtes pour les appels aux APIs externes (géocodage, DPE...)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Cache LRU en mémoire avec expiration des entrées.
+
+    Pensé pour la boucle d'événements asyncio: les accès ne sont jamais
+    interrompus par un await, aucun verrou n'est donc nécessaire.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        """
+        Args:
+            ttl: Durée de vie des entrées (secondes)
+            max_size: Nombre maximal d'entrées (éviction LRU au-delà)
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retourne la valeur en cache si elle n'a pas expiré, sinon None."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        timestamp, value = entry
+        if time.monotonic() - timestamp >= self.ttl:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Ajoute une valeur au cache."""
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
@@ -3,13 +3,120 @@ Service Vision IA - Analyse d'images immobilières
 Utilise des modèles de vision par ordinateur pour analyser les photos
 """
 
+import asyncio
+import copy
 import io
+import logging
+import os
 import base64
-from typing import Dict, Any, List, Optional
-from PIL import Image
+import hashlib
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+from PIL import Image, ImageStat
 import numpy as np
 from datetime import datetime
 
+try:
+    import cv2
+except ImportError:  # OpenCV optionnel: repli sur NumPy
+    cv2 = None
+
+try:
+    from numba import njit
+except ImportError:  # Numba optionnel: repli sur NumPy
+    njit = None
+
+
+logger = logging.getLogger(__name__)
+
+
+if njit is not None:
+    # Noyaux compilés à l'import (signature explicite, cache disque): une
+    # seule passe sur l'image, sans tableaux intermédiaires
+    
+    @njit("float64(uint8[:, ::1])", cache=True, error_model="numpy")
+    def _texture_kernel(gray):
+        """Magnitude moyenne des différences entre pixels voisins (x et y)."""
+        h, w = gray.shape
+        sum_x = 0
+        sum_y = 0
+        for y in range(h):
+            for x in range(w - 1):
+                sum_x += abs(np.int64(gray[y, x + 1]) - np.int64(gray[y, x]))
+        for y in range(h - 1):
+            for x in range(w):
+                sum_y += abs(np.int64(gray[y + 1, x]) - np.int64(gray[y, x]))
+        return (sum_x / (h * (w - 1)) + sum_y / ((h - 1) * w)) / 2
+    
+    @njit("int64[:](uint8[:, ::1])", cache=True, error_model="numpy")
+    def _horizontal_lines_kernel(gray):
+        """Positions Y où la somme des lignes varie au-delà de moyenne + 2 écarts-types."""
+        h, w = gray.shape
+        row_sums = np.zeros(h, dtype=np.int64)
+        for y in range(h):
+            for x in range(w):
+                row_sums[y] += gray[y, x]
+        diff = np.abs(row_sums[1:] - row_sums[:-1])
+        threshold = diff.mean() + 2 * diff.std()
+        return np.nonzero(diff > threshold)[0].astype(np.int64)
+else:
+    _texture_kernel = None
+    _horizontal_lines_kernel = None
+
+
+# Pool de threads partagé pour le décodage et l'analyse, dimensionné sur
+# le nombre de CPU (PIL, NumPy et OpenCV libèrent le GIL pendant leurs
+# traitements en C)
+_CPU_COUNT = os.cpu_count() or 1
+_POOL = ThreadPoolExecutor(max_workers=_CPU_COUNT, thread_name_prefix="vision")
+
+# Nombre maximal d'analyses en cours (en file ou en exécution) : au-delà,
+# les requêtes attendent au lieu d'accumuler des images décodées en mémoire.
+# Un sémaphore par boucle d'événements (lié à la boucle qui l'utilise)
+_MAX_PENDING = 2 * _CPU_COUNT
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Sémaphore des analyses pour la boucle d'événements courante."""
+    loop = asyncio.get_running_loop()
+    semaphore = _SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = _SEMAPHORES[loop] = asyncio.Semaphore(_MAX_PENDING)
+    return semaphore
+
+# Chargement du modèle (une seule fois) et inférence (sérialisée)
+_MODEL_LOCK = threading.Lock()
+_INFERENCE_LOCK = threading.Lock()
+
+
+def _classify_color_code(code: int) -> Tuple[str, float]:
+    """Couleur dominante (nom, poids) pour un masque de bits de _analyze_colors."""
+    if code & 8:
+        return "blanc/clair", 0.6
+    if code & 16:
+        return "sombre", 0.5
+    
+    # Un seul canal au maximum: il domine strictement les deux autres
+    return {
+        1: ("tons chauds/brique", 0.4),
+        2: ("végétation", 0.3),
+        4: ("ciel/froid", 0.3),
+    }.get(code & 7, ("neutre/gris", 0.4))
+
+
+@lru_cache(maxsize=1)
+def _load_yolo(path: str):
+    """Charge le modèle YOLO; conservé en mémoire pour la durée du process."""
+    from ultralytics import YOLO
+    return YOLO(path)
+
 
 class VisionAnalyzer:
     """
@@ -46,6 +153,28 @@ class VisionAnalyzer:
         "gros_travaux": {"label": "Gros travaux", "coef": 0.55}
     }
     
+    # État inconnu (valeurs par défaut des réponses)
+    UNKNOWN_STATE = {"label": "Non déterminé", "coef": 1.0}
+    
+    # Classification de la couleur dominante, indexée par masque de bits:
+    # bits 0-2 = canaux R, G, B à la valeur maximale, bit 3 = tous > 180,
+    # bit 4 = tous < 80
+    _COLOR_BITS = np.array([1, 2, 4, 8, 16])
+    _COLOR_TABLE = tuple(_classify_color_code(code) for code in range(32))
+    
+    # Table de correspondance coefficient -> état (recherche du plus proche)
+    _STATE_KEYS = tuple(STATES)
+    _STATE_COEFS = np.array([state["coef"] for state in STATES.values()])
+    
+    # Modèle fine-tuné (mode ML)
+    MODEL_PATH = os.environ.get("VISION_MODEL_PATH", "models/estim_immo_yolov8.pt")
+    
+    # Taille maximale de l'image analysée (décodage à résolution réduite)
+    ANALYSIS_SIZE = (512, 512)
+    
+    # Cache des analyses, indexé par empreinte du contenu de l'image
+    CACHE_MAX_SIZE = 256
+    
     def __init__(self, use_ml_model: bool = False):
         """
         Initialise l'analyseur.
@@ -57,6 +186,9 @@ class VisionAnalyzer:
         self.use_ml = use_ml_model
         self.model = None
         
+        # Cache LRU en mémoire: empreinte blake2b -> analyse
+        self._cache: OrderedDict = OrderedDict()
+        
         if use_ml_model:
             self._load_model()
     
@@ -66,12 +198,14 @@ class VisionAnalyzer:
         En production, charger un modèle fine-tuné.
         """
         try:
-            # Pour la production avec YOLO:
-            # from ultralytics import YOLO
-            # self.model = YOLO('models/estim_immo_yolov8.pt')
-            pass
+            # Chargé une seule fois par process, partagé entre instances
+            with _MODEL_LOCK:
+                self.model = _load_yolo(self.MODEL_PATH)
         except ImportError:
-            print("YOLO non disponible, utilisation du mode heuristique")
+            logger.info("YOLO non disponible, utilisation du mode heuristique")
+            self.use_ml = False
+        except Exception as e:
+            logger.warning("Modèle vision non chargé (%s): %s", self.MODEL_PATH, e)
             self.use_ml = False
     
     async def analyze(self, image_bytes: bytes) -> Dict[str, Any]:
@@ -84,31 +218,92 @@ class VisionAnalyzer:
         Returns:
             Résultats d'analyse avec type, état, surface estimée, etc.
         """
+        # L'analyse est déterministe: une photo déjà vue n'est pas ré-analysée
+        key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            # Copie profonde: l'appelant peut modifier le résultat (details...)
+            # sans altérer le cache
+            result = copy.deepcopy(cached)
+            result["date_analyse"] = datetime.now().isoformat(timespec="seconds")
+            return result
+        
+        # Décodage et calculs dans le pool, hors de la boucle d'événements
+        loop = asyncio.get_running_loop()
+        async with _get_semaphore():
+            result = await loop.run_in_executor(_POOL, self._analyze_sync, image_bytes)
+        
+        # Ne pas mémoriser les échecs (image illisible, erreur transitoire)
+        if result["details"]["methode"] != "fallback":
+            self._cache[key] = copy.deepcopy(result)
+            while len(self._cache) > self.CACHE_MAX_SIZE:
+                self._cache.popitem(last=False)
+        
+        return result
+    
+    @staticmethod
+    def detect_image_format(header: bytes) -> Optional[str]:
+        """
+        Identifie le format d'une image d'après sa signature (premiers octets).
+        
+        Args:
+            header: Début du fichier (au moins 12 octets)
+            
+        Returns:
+            Type MIME (image/jpeg, image/png, image/webp) ou None si non supporté
+        """
+        if header.startswith(b"\xff\xd8\xff"):
+            return "image/jpeg"
+        if header.startswith(b"\x89PNG\r\n\x1a\n"):
+            return "image/png"
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            return "image/webp"
+        return None
+    
+    def _analyze_sync(self, image_bytes: bytes) -> Dict[str, Any]:
+        """Décode l'image et lance l'analyse (modèle ML ou heuristique), de façon synchrone."""
+        # Rejeter les formats non supportés avant tout décodage
+        if self.detect_image_format(image_bytes[:12]) is None:
+            logger.warning("Erreur analyse vision: format d'image non supporté")
+            return self._get_fallback_analysis()
+        
         try:
             # Charger l'image
             image = Image.open(io.BytesIO(image_bytes))
+            original_size = image.size
             
-            # Convertir en RGB si nécessaire
+            # JPEG: décoder directement en RGB à résolution réduite (mise à
+            # l'échelle DCT de libjpeg, sans décoder l'image complète)
+            if image.format == 'JPEG':
+                image.draft('RGB', self.ANALYSIS_SIZE)
+            
+            # Autres formats (PNG indexé, RGBA, WebP...): une seule
+            # conversion directe vers RGB, sans passer par RGBA
             if image.mode != 'RGB':
                 image = image.convert('RGB')
             
+            image.thumbnail(self.ANALYSIS_SIZE, Image.Resampling.BILINEAR)
+            
             # Analyser
             if self.use_ml and self.model:
-                return await self._analyze_with_model(image)
+                return self._analyze_with_model(image, original_size)
             else:
-                return await self._analyze_heuristic(image)
+                return self._analyze_heuristic(image, original_size)
                 
         except Exception as e:
-            print(f"Erreur analyse vision: {e}")
+            logger.warning("Erreur analyse vision: %s", e)
             return self._get_fallback_analysis()
     
-    async def _analyze_with_model(self, image: Image.Image) -> Dict[str, Any]:
+    def _analyze_with_model(self, image: Image.Image, original_size: tuple) -> Dict[str, Any]:
         """
         Analyse avec modèle ML (YOLO/EfficientDet).
         """
         try:
             # Inférence YOLO
-            results = self.model(image)
+            # Le runtime torch n'est pas sûr en multithread sur un même modèle
+            with _INFERENCE_LOCK:
+                results = self.model(image)
             
             # Parser les résultats
             detections = results[0]
@@ -116,6 +311,7 @@ class VisionAnalyzer:
             # Extraire les classes détectées
             type_bien = self._determine_property_type(detections)
             etat = self._determine_state(detections)
+            state_info = self.STATES.get(etat, self.UNKNOWN_STATE)
             etages = self._count_floors(detections)
             surface = self._estimate_visible_surface(detections, image.size)
             
@@ -123,39 +319,47 @@ class VisionAnalyzer:
                 "type_bien": type_bien,
                 "type_bien_label": self.PROPERTY_TYPES.get(type_bien, "Inconnu"),
                 "etat_exterieur": etat,
-                "etat_label": self.STATES.get(etat, {}).get("label", "Non déterminé"),
-                "coefficient_etat": self.STATES.get(etat, {}).get("coef", 1.0),
+                "etat_label": state_info["label"],
+                "coefficient_etat": state_info["coef"],
                 "nombre_etages_estime": etages,
                 "surface_estimee_vision": surface,
                 "score_confiance": float(detections.probs.top1conf) if hasattr(detections, 'probs') else 0.7,
                 "details": {
-                    "resolution_image": f"{image.size[0]}x{image.size[1]}",
+                    "resolution_image": f"{original_size[0]}x{original_size[1]}",
                     "detections_brutes": len(detections.boxes) if hasattr(detections, 'boxes') else 0,
                     "methode": "ml_model"
                 },
-                "date_analyse": datetime.now().isoformat()
+                "date_analyse": datetime.now().isoformat(timespec="seconds")
             }
             
         except Exception as e:
-            print(f"Erreur modèle ML: {e}")
-            return await self._analyze_heuristic(image)
+            logger.warning("Erreur modèle ML: %s", e)
+            return self._analyze_heuristic(image, original_size)
     
-    async def _analyze_heuristic(self, image: Image.Image) -> Dict[str, Any]:
+    def _analyze_heuristic(self, image: Image.Image, original_size: tuple) -> Dict[str, Any]:
         """
         Analyse heuristique basée sur les caractéristiques de l'image.
         Utilisée quand le modèle ML n'est pas disponible.
+        
+        Args:
+            image: Image réduite (au plus ANALYSIS_SIZE)
+            original_size: Dimensions de la photo d'origine
         """
-        # Convertir en array numpy pour l'analyse
-        img_array = np.array(image)
+        # Vue numpy en lecture seule sur les pixels (pas de copie
+        # supplémentaire: les traitements suivants n'écrivent pas dans l'image)
+        img_array = np.asarray(image)
         
         # 1. Analyse des couleurs dominantes
-        colors = self._analyze_colors(img_array)
+        colors = self._analyze_colors(image)
+        
+        # Niveaux de gris, calculés une seule fois pour la texture et les lignes
+        gray = self._to_grayscale(img_array)
         
         # 2. Analyse de la texture et des bords
-        texture_score = self._analyze_texture(img_array)
+        texture_score = self._analyze_texture(gray)
         
         # 3. Détection de lignes (estimation étages)
-        horizontal_lines = self._detect_horizontal_lines(img_array)
+        horizontal_lines = self._detect_horizontal_lines(gray)
         
         # 4. Ratio d'aspect de l'image
         aspect_ratio = image.size[0] / image.size[1]
@@ -165,117 +369,139 @@ class VisionAnalyzer:
         
         # Déterminer l'état
         etat = self._guess_state(colors, texture_score)
+        state_info = self.STATES.get(etat, self.UNKNOWN_STATE)
         
         # Estimer le nombre d'étages
         etages = self._estimate_floors(horizontal_lines, image.size[1])
         
         # Calculer un score de confiance basé sur la qualité de l'image
-        confidence = self._calculate_confidence(image, colors, texture_score)
+        confidence = self._calculate_confidence(original_size, colors, texture_score)
         
         return {
             "type_bien": type_bien,
             "type_bien_label": self.PROPERTY_TYPES.get(type_bien, "Inconnu"),
             "etat_exterieur": etat,
-            "etat_label": self.STATES.get(etat, {}).get("label", "Non déterminé"),
-            "coefficient_etat": self.STATES.get(etat, {}).get("coef", 1.0),
+            "etat_label": state_info["label"],
+            "coefficient_etat": state_info["coef"],
             "nombre_etages_estime": etages,
             "surface_estimee_vision": None,  # Non disponible en mode heuristique
             "score_confiance": confidence,
             "details": {
-                "resolution_image": f"{image.size[0]}x{image.size[1]}",
-                "couleurs_dominantes": colors[:3],
+                "resolution_image": f"{original_size[0]}x{original_size[1]}",
+                "couleurs_dominantes": [
+                    {"name": colors["dominant"], "ratio": colors["ratio"]},
+                    {"name": "variance", "value": colors["variance"]}
+                ],
                 "score_texture": texture_score,
-                "lignes_detectees": len(horizontal_lines),
+                "lignes_detectees": int(horizontal_lines.size),
                 "methode": "heuristic"
             },
-            "date_analyse": datetime.now().isoformat()
+            "date_analyse": datetime.now().isoformat(timespec="seconds")
         }
     
-    def _analyze_colors(self, img_array: np.ndarray) -> List[Dict]:
+    def _analyze_colors(self, image: Image.Image) -> Dict[str, Any]:
         """
-        Analyse les couleurs dominantes de l'image.
+        Analyse les couleurs dominantes de l'image (RGB, déjà réduite au décodage).
+        
+        Returns:
+            {"dominant": nom de la couleur, "ratio": poids, "variance": variance des pixels}
         """
-        # Redimensionner pour accélérer
-        small = img_array[::10, ::10]
+        # Statistiques par canal, calculées en C par Pillow en une passe
+        stat = ImageStat.Stat(image)
         
         # Moyenne des couleurs
-        avg_color = np.mean(small, axis=(0, 1))
-        
-        # Calculer les proportions de couleurs
-        r, g, b = avg_color
-        
-        colors = []
-        
-        # Classifier les couleurs
-        if r > 180 and g > 180 and b > 180:
-            colors.append({"name": "blanc/clair", "ratio": 0.6})
-        elif r < 80 and g < 80 and b < 80:
-            colors.append({"name": "sombre", "ratio": 0.5})
-        elif r > g and r > b:
-            colors.append({"name": "tons chauds/brique", "ratio": 0.4})
-        elif g > r and g > b:
-            colors.append({"name": "végétation", "ratio": 0.3})
-        elif b > r and b > g:
-            colors.append({"name": "ciel/froid", "ratio": 0.3})
-        else:
-            colors.append({"name": "neutre/gris", "ratio": 0.4})
-        
-        # Variance des couleurs (indique richesse visuelle)
-        variance = np.var(small)
-        colors.append({"name": "variance", "value": float(variance)})
+        means = np.asarray(stat.mean)
+        
+        # Classifier la couleur dominante: masque de bits (canaux au maximum,
+        # tout clair, tout sombre) puis lecture dans la table précalculée
+        bits = np.concatenate((
+            means == means.max(),
+            ((means > 180).all(), (means < 80).all())
+        ))
+        dominant, ratio = self._COLOR_TABLE[int(bits @ self._COLOR_BITS)]
+        
+        # Variance des couleurs (indique richesse visuelle), sur l'ensemble
+        # des valeurs des trois canaux: moyenne des variances par canal
+        # + variance des moyennes par canal
+        variance = np.mean(stat.var) + np.var(stat.mean)
+        
+        return {"dominant": dominant, "ratio": ratio, "variance": float(variance)}
+    
+    @staticmethod
+    def _to_grayscale(img_array: np.ndarray) -> np.ndarray:
+        """
+        Convertit une image RGB en niveaux de gris uint8 (luminance BT.601).
+        Utilise OpenCV si disponible, sinon une somme pondérée entière.
+        """
+        if cv2 is not None:
+            return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
         
-        return colors
+        r = img_array[..., 0].astype(np.uint16)
+        g = img_array[..., 1].astype(np.uint16)
+        b = img_array[..., 2].astype(np.uint16)
+        return ((r * 77 + g * 150 + b * 29) >> 8).astype(np.uint8)
     
-    def _analyze_texture(self, img_array: np.ndarray) -> float:
+    def _analyze_texture(self, gray: np.ndarray) -> float:
         """
-        Analyse la texture de l'image.
+        Analyse la texture de l'image (niveaux de gris uint8).
         Score élevé = textures complexes (peut indiquer vétusté ou détails riches)
         """
-        # Convertir en niveaux de gris
-        gray = np.mean(img_array, axis=2)
-        
-        # Calculer le gradient (sobel simplifié)
+        if cv2 is not None:
+            # Différences entre pixels voisins (x et y) en un seul passage C
+            # par direction: même mesure que les replis Numba et NumPy
+            texture_score = (
+                cv2.mean(cv2.absdiff(gray[:, 1:], gray[:, :-1]))[0]
+                + cv2.mean(cv2.absdiff(gray[1:], gray[:-1]))[0]
+            ) / 2
+            return float(texture_score)
+        
+        if _texture_kernel is not None:
+            return _texture_kernel(gray)
+        
+        # Repli NumPy: gradient (sobel simplifié), en entiers signés
+        gray = gray.astype(np.int16)
         gx = np.diff(gray, axis=1)
         gy = np.diff(gray, axis=0)
         
-        # Score basé sur la magnitude moyenne du gradient
-        texture_score = (np.mean(np.abs(gx)) + np.mean(np.abs(gy))) / 2
+        # Score basé sur la magnitude moyenne du gradient (cumul entier)
+        texture_score = (
+            np.abs(gx).sum(dtype=np.int64) / gx.size
+            + np.abs(gy).sum(dtype=np.int64) / gy.size
+        ) / 2
         
         return float(texture_score)
     
-    def _detect_horizontal_lines(self, img_array: np.ndarray) -> List[int]:
+    def _detect_horizontal_lines(self, gray: np.ndarray) -> np.ndarray:
         """
-        Détecte les lignes horizontales (fenêtres, étages).
-        Retourne les positions Y des lignes détectées.
+        Détecte les lignes horizontales (fenêtres, étages) sur l'image en niveaux de gris.
+        Retourne les positions Y des lignes détectées (tableau trié).
         """
-        # Convertir en niveaux de gris
-        gray = np.mean(img_array, axis=2)
+        if _horizontal_lines_kernel is not None:
+            return _horizontal_lines_kernel(gray)
         
         # Calculer la somme horizontale (lignes = valeurs constantes)
-        row_sums = np.sum(gray, axis=1)
+        row_sums = gray.sum(axis=1, dtype=np.int32)
         
         # Détecter les changements brusques (bords)
         diff = np.abs(np.diff(row_sums))
-        threshold = np.mean(diff) + 2 * np.std(diff)
+        threshold = diff.mean() + 2 * diff.std()
         
-        lines = np.where(diff > threshold)[0].tolist()
-        
-        return lines
+        return np.flatnonzero(diff > threshold)
     
     def _guess_property_type(
         self, 
-        colors: List[Dict], 
+        colors: Dict[str, Any], 
         aspect_ratio: float,
-        horizontal_lines: List[int]
+        horizontal_lines: np.ndarray
     ) -> str:
         """
         Devine le type de bien basé sur les caractéristiques visuelles.
         """
         # Beaucoup de végétation -> terrain ou maison avec jardin
-        has_vegetation = any(c.get("name") == "végétation" for c in colors)
+        has_vegetation = colors["dominant"] == "végétation"
         
         # Nombreuses lignes horizontales -> immeuble
-        many_lines = len(horizontal_lines) > 15
+        many_lines = horizontal_lines.size > 15
         
         # Ratio d'aspect
         is_tall = aspect_ratio < 0.8  # Plus haut que large
@@ -287,24 +513,21 @@ class VisionAnalyzer:
             return "maison"
         elif not many_lines and not has_vegetation:
             # Probablement terrain ou bâtiment simple
-            variance = next((c.get("value", 0) for c in colors if c.get("name") == "variance"), 0)
-            if variance < 500:
+            if colors["variance"] < 500:
                 return "terrain"
             else:
                 return "maison"
         else:
             return "maison"  # Par défaut
     
-    def _guess_state(self, colors: List[Dict], texture_score: float) -> str:
+    def _guess_state(self, colors: Dict[str, Any], texture_score: float) -> str:
         """
         Devine l'état du bien basé sur les couleurs et textures.
         """
-        # Récupérer la variance
-        variance = next((c.get("value", 0) for c in colors if c.get("name") == "variance"), 0)
+        variance = colors["variance"]
         
         # Couleurs claires et uniformes -> neuf/récent
-        has_light = any(c.get("name") in ["blanc/clair"] for c in colors)
-        has_warm = any(c.get("name") in ["tons chauds/brique"] for c in colors)
+        has_light = colors["dominant"] == "blanc/clair"
         
         # Score composite
         if has_light and texture_score < 15 and variance < 2000:
@@ -320,30 +543,38 @@ class VisionAnalyzer:
         else:
             return "renovation"
     
-    def _estimate_floors(self, horizontal_lines: List[int], image_height: int) -> int:
+    def _estimate_floors(self, horizontal_lines: np.ndarray, image_height: int) -> int:
         """
-        Estime le nombre d'étages basé sur les lignes horizontales.
+        Estime le nombre d'étages basé sur les lignes horizontales (positions triées).
         """
-        if not horizontal_lines:
+        if horizontal_lines.size == 0:
             return 1
         
-        # Filtrer les lignes trop proches
-        filtered_lines = []
+        # Filtrer les lignes trop proches: chaque ligne retenue est la première
+        # au-delà de min_distance de la précédente retenue, trouvée par
+        # recherche dichotomique (au plus ~10 itérations, quel que soit
+        # le nombre de lignes détectées)
         min_distance = image_height / 10  # Minimum 10% de l'image entre étages
         
-        for line in sorted(horizontal_lines):
-            if not filtered_lines or line - filtered_lines[-1] > min_distance:
-                filtered_lines.append(line)
+        kept = 1
+        idx = 0
+        while True:
+            idx = int(np.searchsorted(
+                horizontal_lines, horizontal_lines[idx] + min_distance, side="right"
+            ))
+            if idx >= horizontal_lines.size:
+                break
+            kept += 1
         
         # Estimer les étages (lignes / 2 car fenêtres haut et bas)
-        estimated = max(1, len(filtered_lines) // 3)
+        estimated = max(1, kept // 3)
         
         return min(estimated, 10)  # Cap à 10 étages
     
     def _calculate_confidence(
         self, 
-        image: Image.Image, 
-        colors: List[Dict],
+        image_size: tuple, 
+        colors: Dict[str, Any],
         texture_score: float
     ) -> float:
         """
@@ -351,8 +582,8 @@ class VisionAnalyzer:
         """
         confidence = 50.0  # Base
         
-        # Bonus pour bonne résolution
-        min_dim = min(image.size)
+        # Bonus pour bonne résolution (photo d'origine)
+        min_dim = min(image_size)
         if min_dim >= 1000:
             confidence += 15
         elif min_dim >= 500:
@@ -361,8 +592,7 @@ class VisionAnalyzer:
             confidence -= 20
         
         # Bonus pour image bien exposée (pas trop sombre/claire)
-        variance = next((c.get("value", 0) for c in colors if c.get("name") == "variance"), 0)
-        if 500 < variance < 5000:
+        if 500 < colors["variance"] < 5000:
             confidence += 10
         
         # Bonus pour texture détectable
@@ -387,20 +617,16 @@ class VisionAnalyzer:
         if len(analyses) == 1:
             return analyses[0]
         
-        # Type de bien: vote majoritaire
-        types = [a.get("type_bien", "inconnu") for a in analyses]
-        type_bien = max(set(types), key=types.count)
+        # Type de bien: vote majoritaire (égalité: premier rencontré)
+        types = Counter(a.get("type_bien", "inconnu") for a in analyses)
+        type_bien = types.most_common(1)[0][0]
         
         # État: moyenne des coefficients
         coefs = [a.get("coefficient_etat", 1.0) for a in analyses]
         avg_coef = sum(coefs) / len(coefs)
         
-        # Trouver l'état correspondant au coefficient moyen
-        etat = "bon"
-        for state_key, state_info in self.STATES.items():
-            if abs(state_info["coef"] - avg_coef) < 0.05:
-                etat = state_key
-                break
+        # Trouver l'état dont le coefficient est le plus proche de la moyenne
+        etat = self._STATE_KEYS[int(np.argmin(np.abs(self._STATE_COEFS - avg_coef)))]
         
         # Étages: maximum détecté
         etages = max(a.get("nombre_etages_estime", 1) for a in analyses)
@@ -413,7 +639,7 @@ class VisionAnalyzer:
             "type_bien": type_bien,
             "type_bien_label": self.PROPERTY_TYPES.get(type_bien, "Inconnu"),
             "etat_exterieur": etat,
-            "etat_label": self.STATES.get(etat, {}).get("label", "Non déterminé"),
+            "etat_label": self.STATES.get(etat, self.UNKNOWN_STATE)["label"],
             "coefficient_etat": avg_coef,
             "nombre_etages_estime": etages,
             "surface_estimee_vision": None,
@@ -423,7 +649,7 @@ class VisionAnalyzer:
                 "methode": "fusion_multi_photos",
                 "analyses_individuelles": [a.get("score_confiance", 0) for a in analyses]
             },
-            "date_analyse": datetime.now().isoformat()
+            "date_analyse": datetime.now().isoformat(timespec="seconds")
         }
     
     def _get_fallback_analysis(self) -> Dict[str, Any]:
@@ -443,7 +669,7 @@ class VisionAnalyzer:
                 "methode": "fallback",
                 "raison": "Analyse impossible"
             },
-            "date_analyse": datetime.now().isoformat()
+            "date_analyse": datetime.now().isoformat(timespec="seconds")
         }
     
     # Méthodes pour le mode ML (stubs)
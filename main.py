@@ -5,13 +5,19 @@ Utilise la vision par ordinateur, données cadastrales et DVF
 """
 
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import io
-import base64
+import asyncio
+import atexit
+import binascii
+import logging
+import logging.handlers
+import queue
 from datetime import datetime
 
 from services.cadastre import CadastreService
@@ -20,13 +26,42 @@ from services.dpe import DPEService
 from services.vision import VisionAnalyzer
 from services.estimation import EstimationEngine
 from services.pdf_report import PDFReportGenerator
+from services.http_client import close_http_client
+
+# Journalisation: les services écrivent dans une file, un thread dédié
+# (QueueListener) se charge des écritures pour ne pas bloquer la boucle async
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))  # mise en forme finale par log_handler
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cycle de vie: fermeture des connexions HTTP et des caches disque à l'arrêt."""
+    yield
+    await cadastre_service.close()
+    await dvf_service.close()
+    await dpe_service.close()
+    await pdf_generator.close()
+    await close_http_client()
+
 
 app = FastAPI(
     title="EstimImmo AI",
     description="API d'estimation immobilière automatisée par IA",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configuration CORS pour l'app mobile
@@ -159,7 +194,7 @@ async def health_check():
     }
 
 
-@app.post("/estimate", response_model=EstimationResult)
+@app.post("/estimate", response_model=EstimationResult, response_model_exclude_none=True)
 async def estimate_property(
     latitude: float = Query(..., ge=-90, le=90, description="Latitude GPS"),
     longitude: float = Query(..., ge=-180, le=180, description="Longitude GPS"),
@@ -178,35 +213,34 @@ async def estimate_property(
     5. Calcul de l'estimation avec intervalle de confiance
     """
     try:
-        # 1. Lecture et validation de l'image
-        image_bytes = await file.read()
-        if len(image_bytes) == 0:
+        # 1. Validation de l'image, avant de lire son contenu
+        # Format identifié par la signature du fichier, pas par le type
+        # annoncé par le client (la taille n'est pas toujours connue)
+        header = await file.read(16)
+        await file.seek(0)
+        if not header:
             raise HTTPException(status_code=400, detail="Fichier image vide")
-        
-        # Vérifier le type MIME
-        content_type = file.content_type
-        if content_type not in ["image/jpeg", "image/png", "image/webp"]:
+        if VisionAnalyzer.detect_image_format(header) is None:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Format d'image non supporté: {content_type}. Utilisez JPEG, PNG ou WebP."
+                detail=f"Format d'image non supporté: {file.content_type}. Utilisez JPEG, PNG ou WebP."
             )
         
-        # 2. Analyse Vision par IA
-        vision_data = await vision_analyzer.analyze(image_bytes)
-        
-        # 3. Données Cadastrales
-        cadastre_data = await cadastre_service.get_parcelle(latitude, longitude)
+        image_bytes = await file.read()
         
-        # 4. Données DVF (transactions récentes)
-        dvf_data = await dvf_service.get_stats(
-            latitude, longitude, 
-            radius_meters=500,
-            months=12
+        # 2-5. Analyse vision, cadastre, DVF (transactions récentes) et DPE:
+        # indépendants les uns des autres, lancés en parallèle
+        vision_data, cadastre_data, dvf_data, dpe_data = await asyncio.gather(
+            vision_analyzer.analyze(image_bytes),
+            cadastre_service.get_parcelle(latitude, longitude),
+            dvf_service.get_stats(
+                latitude, longitude,
+                radius_meters=500,
+                months=12
+            ),
+            dpe_service.get_dpe(latitude, longitude)
         )
         
-        # 5. Données DPE (optionnel)
-        dpe_data = await dpe_service.get_dpe(latitude, longitude)
-        
         # 6. Calcul de l'estimation
         estimation = estimation_engine.calculate(
             cadastre=cadastre_data,
@@ -220,11 +254,18 @@ async def estimate_property(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Erreur estimation: {e}")
+        logger.exception("Erreur estimation: %s", e)
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'estimation: {str(e)}")
 
 
-@app.post("/estimate/multi", response_model=EstimationResult)
+async def _analyze_base64(img_b64: str) -> dict:
+    """Décode une image base64 (dans un thread) et l'analyse."""
+    loop = asyncio.get_running_loop()
+    image_bytes = await loop.run_in_executor(None, binascii.a2b_base64, img_b64)
+    return await vision_analyzer.analyze(image_bytes)
+
+
+@app.post("/estimate/multi", response_model=EstimationResult, response_model_exclude_none=True)
 async def estimate_multi_photos(request: MultiPhotoRequest):
     """
     📸 Estimation avec plusieurs photos
@@ -242,16 +283,33 @@ async def estimate_multi_photos(request: MultiPhotoRequest):
         if len(request.images_base64) > 10:
             raise HTTPException(status_code=400, detail="Maximum 10 images par estimation")
         
-        # Décoder et analyser toutes les images
+        # Images en double (doublons de galerie, rafales): analysées une
+        # seule fois, dans l'ordre d'envoi
+        unique_images = dict.fromkeys(request.images_base64)
+        
+        # Analyse de toutes les images et données externes (cadastre,
+        # DVF, DPE), en parallèle
+        results, cadastre_data, dvf_data, dpe_data = await asyncio.gather(
+            asyncio.gather(
+                *(_analyze_base64(img_b64) for img_b64 in unique_images),
+                return_exceptions=True
+            ),
+            cadastre_service.get_parcelle(request.latitude, request.longitude),
+            dvf_service.get_stats(
+                request.latitude,
+                request.longitude,
+                radius_meters=500,
+                months=12
+            ),
+            dpe_service.get_dpe(request.latitude, request.longitude)
+        )
+        
         all_vision_results = []
-        for img_b64 in request.images_base64:
-            try:
-                image_bytes = base64.b64decode(img_b64)
-                vision_result = await vision_analyzer.analyze(image_bytes)
-                all_vision_results.append(vision_result)
-            except Exception as e:
-                print(f"Erreur décodage image: {e}")
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Erreur décodage image: %s", result)
                 continue
+            all_vision_results.append(result)
         
         if not all_vision_results:
             raise HTTPException(status_code=400, detail="Aucune image valide")
@@ -259,12 +317,6 @@ async def estimate_multi_photos(request: MultiPhotoRequest):
         # Fusion des analyses vision
         vision_data = vision_analyzer.merge_analyses(all_vision_results)
         
-        # Données cadastrales
-        cadastre_data = await cadastre_service.get_parcelle(
-            request.latitude, 
-            request.longitude
-        )
-        
         # Mode expert: fusionner avec données manuelles
         if request.mode_expert and request.donnees_manuelles:
             cadastre_data = cadastre_service.merge_with_manual(
@@ -272,15 +324,6 @@ async def estimate_multi_photos(request: MultiPhotoRequest):
                 request.donnees_manuelles
             )
         
-        # DVF et DPE
-        dvf_data = await dvf_service.get_stats(
-            request.latitude, 
-            request.longitude,
-            radius_meters=500,
-            months=12
-        )
-        dpe_data = await dpe_service.get_dpe(request.latitude, request.longitude)
-        
         # Calcul final
         estimation = estimation_engine.calculate(
             cadastre=cadastre_data,
@@ -295,7 +338,7 @@ async def estimate_multi_photos(request: MultiPhotoRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Erreur estimation multi: {e}")
+        logger.exception("Erreur estimation multi: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -332,7 +375,7 @@ async def generate_pdf_report(estimation: EstimationResult):
     📄 Générer un rapport PDF professionnel
     """
     try:
-        pdf_path = pdf_generator.generate(estimation)
+        pdf_path = await pdf_generator.generate_async(estimation)
         return FileResponse(
             pdf_path,
             media_type="application/pdf",
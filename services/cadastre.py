@@ -3,10 +3,33 @@ Service Cadastre - Accès aux données cadastrales françaises
 Utilise l'API IGN (APICarto) et data.gouv.fr
 """
 
-import httpx
+import asyncio
+import logging
+import os
+import aiohttp
 from typing import Optional, Dict, Any
-import json
+import time
+from collections import OrderedDict
 from datetime import datetime
+import diskcache
+import ijson
+import numpy as np
+import orjson
+from pyproj import Geod
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(obj: Any) -> str:
+    """Sérialise en JSON via orjson (encodeur C)."""
+    return orjson.dumps(obj).decode()
 
 
 class CadastreService:
@@ -19,9 +42,72 @@ class CadastreService:
     # URLs des APIs
     APICARTO_URL = "https://apicarto.ign.fr/api/cadastre/parcelle"
     CADASTRE_GOUV_URL = "https://cadastre.data.gouv.fr/bundler/cadastre-etalab"
+    BATIMENTS_URL = "https://apicarto.ign.fr/api/gpu/document"
+    
+    # Disjoncteur APICarto: après BREAKER_THRESHOLD échecs consécutifs,
+    # les requêtes sont court-circuitées vers le fallback pendant BREAKER_RESET s
+    BREAKER_THRESHOLD = 5
+    BREAKER_RESET = 30.0
+    
+    # Champs que l'expert peut surcharger (mode expert)
+    EXPERT_FIELDS = frozenset({
+        "surface_terrain",
+        "surface_batie",
+        "surface_habitable",
+        "annee_construction",
+        "nombre_pieces",
+        "nombre_etages",
+        "type_chauffage",
+        "etat_general",
+        "travaux_recents"
+    })
+    
+    # Calcul géodésique des surfaces (ellipsoïde WGS84)
+    _GEOD = Geod(ellps="WGS84")
+    
+    # Aire de boîte englobante (degrés²) en dessous de laquelle un anneau
+    # est considéré dégénéré (~1 m²)
+    AIRE_MIN_DEG2 = 1e-10
+    
+    # Cache des parcelles (clé = coordonnées arrondies à ~1 m)
+    CACHE_TTL = 24 * 3600  # secondes
+    CACHE_MAX_SIZE = 10000
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Initialise le service.
+        
+        Args:
+            cache_dir: Répertoire du cache disque des parcelles
+                       (par défaut $CACHE_DIR ou /tmp/estimmo_cache)
+        """
+        # Session aiohttp créée à la première requête (dans la boucle d'événements)
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # État du disjoncteur
+        self._fail_count = 0
+        self._breaker_open_until = 0.0
+        self._cache: OrderedDict = OrderedDict()
+        
+        # Cache disque: survit aux redémarrages du process
+        self.disk_cache = diskcache.Cache(
+            cache_dir or os.environ.get("CACHE_DIR", "/tmp/estimmo_cache"),
+            size_limit=2 << 30
+        )
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Session HTTP partagée (pool de connexions keep-alive)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=20,
+                    keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=10, connect=3)
+            )
+        return self._session
     
     async def get_parcelle(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
         """
@@ -34,6 +120,17 @@ class CadastreService:
         Returns:
             Dictionnaire avec les infos cadastrales ou None si non trouvé
         """
+        key = (round(lat, 5), round(lon, 5))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        now_iso = datetime.now().isoformat()
+        
+        # APICarto en panne: pas de requête tant que le disjoncteur est ouvert
+        if time.monotonic() < self._breaker_open_until:
+            return self._get_fallback_data(lat, lon, now_iso=now_iso)
+        
         try:
             # 1. Requête APICarto avec géométrie Point
             geojson_point = {
@@ -42,24 +139,29 @@ class CadastreService:
             }
             
             params = {
-                "geom": json.dumps(geojson_point)
+                "geom": _dumps(geojson_point)
             }
             
-            response = await self.client.get(
-                self.APICARTO_URL,
-                params=params,
-                headers={"Accept": "application/json"}
+            # La requête bâtiments part en parallèle avec le point GPS comme
+            # géométrie, plutôt que d'attendre la géométrie de la parcelle
+            data, hauteur_batiment = await asyncio.gather(
+                self._fetch_parcelle(params),
+                self._fetch_hauteur_batiment(params),
+                return_exceptions=True
             )
             
-            if response.status_code != 200:
-                print(f"Erreur APICarto: {response.status_code} - {response.text}")
-                return self._get_fallback_data(lat, lon)
+            if isinstance(data, BaseException):
+                raise data
             
-            data = response.json()
+            if data is None:
+                self._record_failure()
+                return self._get_fallback_data(lat, lon, now_iso=now_iso)
+            
+            self._fail_count = 0
             
             if not data.get("features") or len(data["features"]) == 0:
-                print("Aucune parcelle trouvée aux coordonnées")
-                return self._get_fallback_data(lat, lon)
+                logger.debug("Aucune parcelle trouvée aux coordonnées")
+                return self._get_fallback_data(lat, lon, now_iso=now_iso)
             
             # Extraire les propriétés de la première parcelle
             feature = data["features"][0]
@@ -83,91 +185,173 @@ class CadastreService:
                 "geometry": geometry,
                 "surface_calculee": surface_calculee,
                 "source": "APICarto IGN",
-                "date_requete": datetime.now().isoformat()
+                "date_requete": now_iso
             }
             
-            # 2. Enrichir avec les données de la matrice cadastrale si disponible
-            enriched = await self._enrich_with_batiments(result)
+            # 2. Enrichir avec les données bâtiments récupérées en parallèle
+            enriched = self._enrich_with_batiments(result, hauteur_batiment)
             
-            return enriched
+            self._cache_set(key, enriched)
+            return dict(enriched)
             
-        except httpx.TimeoutException:
-            print("Timeout lors de la requête cadastre")
-            return self._get_fallback_data(lat, lon)
+        except asyncio.TimeoutError:
+            logger.warning("Timeout lors de la requête cadastre")
+            self._record_failure()
+            return self._get_fallback_data(lat, lon, now_iso=now_iso)
+        except aiohttp.ClientError as e:
+            logger.warning("Erreur réseau cadastre: %s", e)
+            self._record_failure()
+            return self._get_fallback_data(lat, lon, now_iso=now_iso)
         except Exception as e:
-            print(f"Erreur service cadastre: {e}")
-            return self._get_fallback_data(lat, lon)
+            logger.warning("Erreur service cadastre: %s", e)
+            return self._get_fallback_data(lat, lon, now_iso=now_iso)
+    
+    def _record_failure(self):
+        """Compte un échec APICarto et ouvre le disjoncteur au-delà du seuil."""
+        self._fail_count += 1
+        if self._fail_count >= self.BREAKER_THRESHOLD:
+            logger.warning(
+                "APICarto indisponible (%d échecs) - fallback pendant %.0f s",
+                self._fail_count, self.BREAKER_RESET
+            )
+            self._breaker_open_until = time.monotonic() + self.BREAKER_RESET
+            self._fail_count = 0
     
-    async def _enrich_with_batiments(self, cadastre_data: Dict) -> Dict:
+    def _cache_get(self, key: tuple) -> Optional[Dict[str, Any]]:
         """
-        Enrichit les données avec les informations sur les bâtiments
-        via l'API des bâtiments de la BD TOPO
+        Retourne une copie de la parcelle en cache si elle n'a pas expiré.
+        Cherche d'abord en mémoire, puis dans le cache disque.
         """
-        try:
-            # API Bâtiments IGN
-            batiments_url = "https://apicarto.ign.fr/api/gpu/document"
-            
-            if cadastre_data.get("geometry"):
-                params = {
-                    "geom": json.dumps(cadastre_data["geometry"])
-                }
-                
-                response = await self.client.get(batiments_url, params=params)
-                
-                if response.status_code == 200:
-                    batiments = response.json()
-                    if batiments.get("features"):
-                        # Extraire les infos des bâtiments
-                        for bat in batiments["features"]:
-                            props = bat.get("properties", {})
-                            if props.get("hauteur"):
-                                # Estimer le nombre d'étages (3m par étage en moyenne)
-                                hauteur = float(props["hauteur"])
-                                cadastre_data["nombre_etages_cadastre"] = max(1, int(hauteur / 3))
-            
-            return cadastre_data
+        entry = self._cache.get(key)
+        if entry is not None:
+            timestamp, data = entry
+            if time.monotonic() - timestamp < self.CACHE_TTL:
+                self._cache.move_to_end(key)
+                return dict(data)
+            del self._cache[key]
+        
+        data = self.disk_cache.get(f"parcelle:{key[0]}:{key[1]}")
+        if data is None:
+            return None
+        
+        self._cache_set_memory(key, data)
+        return dict(data)
+    
+    def _cache_set(self, key: tuple, data: Dict[str, Any]):
+        """Ajoute une parcelle aux caches mémoire et disque."""
+        self._cache_set_memory(key, data)
+        self.disk_cache.set(f"parcelle:{key[0]}:{key[1]}", data, expire=self.CACHE_TTL)
+    
+    def _cache_set_memory(self, key: tuple, data: Dict[str, Any]):
+        """Ajoute une parcelle au cache mémoire (éviction LRU au-delà de la taille max)."""
+        self._cache[key] = (time.monotonic(), data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.CACHE_MAX_SIZE:
+            self._cache.popitem(last=False)
+    
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=0.1, max=1.0),
+        retry=retry_if_exception_type(aiohttp.ClientConnectionError),
+        reraise=True
+    )
+    async def _fetch_parcelle(self, params: Dict) -> Optional[Dict]:
+        """
+        Interroge APICarto et retourne la FeatureCollection des parcelles
+        (None si l'API répond en erreur). Les erreurs de connexion
+        transitoires sont retentées une fois.
+        """
+        async with self.session.get(
+            self.APICARTO_URL,
+            params=params,
+            headers={"Accept": "application/json"}
+        ) as response:
+            if response.status != 200:
+                logger.warning("Erreur APICarto: %s - %s", response.status, await response.text())
+                return None
             
-        except Exception as e:
-            print(f"Erreur enrichissement bâtiments: {e}")
-            return cadastre_data
+            return await response.json(loads=orjson.loads, content_type=None)
+    
+    async def _fetch_hauteur_batiment(self, params: Dict) -> Optional[float]:
+        """
+        Récupère la hauteur du bâtiment via l'API des bâtiments de la BD TOPO.
+        
+        La réponse est lue en streaming: seul le champ `properties.hauteur`
+        de chaque feature est décodé, sans construire la FeatureCollection.
+        """
+        hauteur = None
+        
+        async with self.session.get(self.BATIMENTS_URL, params=params) as response:
+            if response.status != 200:
+                return None
+            
+            hauteurs = ijson.sendable_list()
+            parser = ijson.items_coro(hauteurs, "features.item.properties.hauteur")
+            async for chunk in response.content.iter_any():
+                parser.send(chunk)
+                for h in hauteurs:
+                    if h:
+                        hauteur = float(h)
+                del hauteurs[:]
+            parser.close()
+        
+        return hauteur
+    
+    def _enrich_with_batiments(self, cadastre_data: Dict, hauteur: Any) -> Dict:
+        """
+        Enrichit les données avec les informations sur les bâtiments.
+        
+        Args:
+            cadastre_data: Données cadastrales à enrichir
+            hauteur: Hauteur du bâtiment en m (ou exception levée par la requête)
+        """
+        if isinstance(hauteur, BaseException):
+            logger.warning("Erreur enrichissement bâtiments: %s", hauteur)
+        elif hauteur:
+            # Estimer le nombre d'étages (3m par étage en moyenne)
+            cadastre_data["nombre_etages_cadastre"] = max(1, int(hauteur / 3))
+        
+        return cadastre_data
     
     def _calculate_surface_from_geometry(self, geometry: Dict) -> Optional[float]:
         """
-        Calcule la surface approximative à partir de la géométrie GeoJSON.
-        Utilise une approximation en m² basée sur les coordonnées.
+        Calcule la surface géodésique (m², ellipsoïde WGS84) d'une géométrie
+        GeoJSON Polygon ou MultiPolygon (parcelles scindées). Les trous
+        (anneaux intérieurs) sont déduits de la surface.
         """
         try:
-            if geometry.get("type") != "Polygon":
+            geom_type = geometry.get("type")
+            if geom_type == "Polygon":
+                polygons = [geometry.get("coordinates") or []]
+            elif geom_type == "MultiPolygon":
+                polygons = geometry.get("coordinates") or []
+            else:
                 return None
             
-            coords = geometry.get("coordinates", [[]])
-            if not coords or not coords[0]:
+            if not polygons or not polygons[0]:
                 return None
             
-            # Calcul simple de l'aire du polygone (formule de Shoelace)
-            # Note: approximation car ne tient pas compte de la courbure terrestre
-            ring = coords[0]
-            n = len(ring)
-            area = 0.0
-            
-            for i in range(n):
-                j = (i + 1) % n
-                area += ring[i][0] * ring[j][1]
-                area -= ring[j][0] * ring[i][1]
-            
-            area = abs(area) / 2.0
-            
-            # Conversion degrés² en m² (approximation pour la France)
-            # 1 degré ≈ 111km en latitude, ~80km en longitude (France)
-            area_m2 = area * 111000 * 80000
+            area_m2 = 0.0
+            for rings in polygons:
+                for i, ring in enumerate(rings):
+                    arr = np.asarray(ring, dtype=np.float64)
+                    
+                    # Sortie rapide pour les anneaux dégénérés (points, segments)
+                    if len(arr) < 3 or np.ptp(arr[:, 0]) * np.ptp(arr[:, 1]) < self.AIRE_MIN_DEG2:
+                        continue
+                    
+                    ring_area, _ = self._GEOD.polygon_area_perimeter(arr[:, 0], arr[:, 1])
+                    
+                    # Anneau extérieur compté positivement, trous soustraits
+                    area_m2 += abs(ring_area) if i == 0 else -abs(ring_area)
             
             return round(area_m2, 2)
             
         except Exception as e:
-            print(f"Erreur calcul surface: {e}")
+            logger.warning("Erreur calcul surface: %s", e)
             return None
     
-    def _get_fallback_data(self, lat: float, lon: float) -> Dict:
+    def _get_fallback_data(self, lat: float, lon: float, now_iso: Optional[str] = None) -> Dict:
         """
         Données de fallback quand l'API n'est pas disponible.
         Retourne une structure vide mais valide.
@@ -181,7 +365,7 @@ class CadastreService:
             "surface_batie": None,
             "annee_construction": None,
             "source": "fallback",
-            "date_requete": datetime.now().isoformat(),
+            "date_requete": now_iso or datetime.now().isoformat(),
             "avertissement": "Données cadastrales non disponibles - estimation basée uniquement sur la vision et DVF"
         }
     
@@ -199,23 +383,12 @@ class CadastreService:
         """
         merged = cadastre_data.copy()
         
-        # Liste des champs que l'expert peut surcharger
-        expert_fields = [
-            "surface_terrain",
-            "surface_batie",
-            "surface_habitable",
-            "annee_construction",
-            "nombre_pieces",
-            "nombre_etages",
-            "type_chauffage",
-            "etat_general",
-            "travaux_recents"
-        ]
-        
-        for field in expert_fields:
-            if field in manual_data and manual_data[field] is not None:
-                merged[field] = manual_data[field]
-                merged[f"{field}_source"] = "manuel"
+        # Seuls les champs experts effectivement saisis sont parcourus
+        for field in self.EXPERT_FIELDS & manual_data.keys():
+            value = manual_data[field]
+            if value is not None:
+                merged[field] = value
+                merged[field + "_source"] = "manuel"
         
         merged["mode_expert"] = True
         
@@ -236,17 +409,18 @@ class CadastreService:
                 "geometry": "centre"
             }
             
-            response = await self.client.get(geo_url, params=params)
-            
-            if response.status_code == 200:
-                return response.json()
+            async with self.session.get(geo_url, params=params) as response:
+                if response.status == 200:
+                    return await response.json(loads=orjson.loads, content_type=None)
             
             return []
             
         except Exception as e:
-            print(f"Erreur communes proches: {e}")
+            logger.warning("Erreur communes proches: %s", e)
             return []
     
     async def close(self):
-        """Ferme le client HTTP"""
-        await self.client.aclose()
+        """Ferme la session HTTP et le cache disque"""
+        if self._session is not None:
+            await self._session.close()
+        self.disk_cache.close()
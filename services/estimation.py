@@ -5,7 +5,9 @@ Fusionne les données cadastrales, DVF, DPE et vision pour produire une estimati
 
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+from functools import lru_cache
 import math
+import numpy as np
 
 
 class EstimationEngine:
@@ -39,6 +41,28 @@ class EstimationEngine:
         "inconnu": 0.30
     }
     
+    # Surface habitable par défaut (m²) si aucune donnée
+    SURFACE_DEFAUT = {
+        "maison": 100,
+        "appartement": 70,
+        "immeuble": 500,
+        "terrain": 0,
+        "local_commercial": 150,
+        "inconnu": 80
+    }
+    
+    # Coefficient d'ajustement selon la classe DPE
+    # (impact significatif sur la valeur depuis 2023)
+    COEF_DPE = {
+        "A": 1.08,   # +8%
+        "B": 1.05,   # +5%
+        "C": 1.02,   # +2%
+        "D": 1.00,   # Référence
+        "E": 0.95,   # -5%
+        "F": 0.88,   # -12% (passoire thermique)
+        "G": 0.82,   # -18% (passoire thermique + interdiction location)
+    }
+    
     # Ajustement saisonnier (marché immobilier)
     COEF_SAISON = {
         1: 0.98,   # Janvier - marché calme
@@ -55,13 +79,18 @@ class EstimationEngine:
         12: 0.98   # Fêtes
     }
     
+    # Tables précalculées (accès par index plutôt que par dict.get)
+    _SAISON_TUPLE = tuple(map(COEF_SAISON.get, range(1, 13)))  # index = mois - 1
+    _ETAGES_TUPLE = (1.0,) + tuple(map(COEF_ETAGES.get, range(1, 6)))  # index = étages
+    
     def calculate(
         self,
         cadastre: Dict[str, Any],
         dvf: Dict[str, Any],
         vision: Dict[str, Any],
         dpe: Optional[Dict[str, Any]] = None,
-        multi_photo_boost: bool = False
+        multi_photo_boost: bool = False,
+        now: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """
         Calcule l'estimation complète du bien.
@@ -72,21 +101,24 @@ class EstimationEngine:
             vision: Analyse vision IA
             dpe: Données DPE (optionnel)
             multi_photo_boost: Boost de confiance si photos multiples
+            now: Horodatage de l'estimation (par défaut datetime.now())
             
         Returns:
             Estimation complète avec prix, confiance, détails
         """
-        # 1. Récupérer les données de base
-        surface_terrain = cadastre.get("surface_terrain", 0)
+        # 1. Récupérer les données de base (une seule lecture par champ)
+        surface_terrain = cadastre.get("surface_terrain", 0) or 0
         surface_batie_cadastre = cadastre.get("surface_batie")
         
         prix_m2_base = dvf.get("prix_m2_moyen", 3000)
-        prix_m2_median = dvf.get("prix_m2_median", prix_m2_base)
+        nb_transactions = dvf.get("nb_transactions", 0)
         
         type_bien = vision.get("type_bien", "maison")
-        etat = vision.get("etat_exterieur", "bon")
         coef_etat = vision.get("coefficient_etat", 1.0)
         etages = vision.get("nombre_etages_estime", 1)
+        vision_confidence = vision.get("score_confiance", 50)
+        
+        classe_dpe = dpe.get("classe_energie") if dpe else None
         
         # 2. Calculer la surface habitable
         surface_habitable = self._calculate_surface_habitable(
@@ -96,24 +128,15 @@ class EstimationEngine:
             etages=etages
         )
         
-        # 3. Calculer les coefficients d'ajustement
-        
-        # Coefficient état (vision)
-        coef_total = coef_etat
-        
-        # Coefficient étages
-        coef_total *= self.COEF_ETAGES.get(min(etages, 5), 1.0)
-        
-        # Coefficient saisonnier
-        mois_actuel = datetime.now().month
-        coef_total *= self.COEF_SAISON.get(mois_actuel, 1.0)
-        
-        # Coefficient DPE
-        coef_dpe = 1.0
-        if dpe:
-            classe_dpe = dpe.get("classe_energie")
-            coef_dpe = self._get_dpe_coefficient(classe_dpe)
-            coef_total *= coef_dpe
+        # 3. Calculer les coefficients d'ajustement (état, étages, saison, DPE)
+        if now is None:
+            now = datetime.now()
+        now_iso = now.isoformat()
+        # int(): la vision peut renvoyer un nombre d'étages flottant (2.0)
+        coef_etages = self._ETAGES_TUPLE[min(max(int(etages), 0), 5)]
+        coef_saison = self._SAISON_TUPLE[now.month - 1]
+        coef_dpe = self._get_dpe_coefficient(classe_dpe)
+        coef_total = coef_etat * coef_etages * coef_saison * coef_dpe
         
         # 4. Calculer le prix ajusté au m²
         prix_m2_ajuste = prix_m2_base * coef_total
@@ -122,36 +145,230 @@ class EstimationEngine:
         prix_total = surface_habitable * prix_m2_ajuste
         
         # 6. Calculer l'intervalle de confiance
-        ecart_type = dvf.get("ecart_type", prix_m2_base * 0.15)
+        # Confiance arrondie au centième: entrées du cache réutilisables
         marge_erreur = self._calculate_margin(
-            ecart_type=ecart_type,
-            nb_transactions=dvf.get("nb_transactions", 0),
-            vision_confidence=vision.get("score_confiance", 50),
+            nb_transactions=nb_transactions,
+            vision_confidence=round(vision_confidence, 2),
             has_dpe=dpe is not None
         )
         
         prix_bas = prix_total * (1 - marge_erreur)
         prix_haut = prix_total * (1 + marge_erreur)
         
+        return self._build_result(
+            cadastre, dvf, vision, dpe,
+            multi_photo_boost=multi_photo_boost,
+            now_iso=now_iso,
+            surface_habitable=surface_habitable,
+            prix_m2_base=prix_m2_base,
+            prix_m2_ajuste=prix_m2_ajuste,
+            prix_total=prix_total,
+            prix_bas=prix_bas,
+            prix_haut=prix_haut,
+            marge_erreur=marge_erreur,
+            coef_etat=coef_etat,
+            coef_dpe=coef_dpe,
+            coef_etages=coef_etages,
+            coef_saison=coef_saison,
+            coef_total=coef_total
+        )
+    
+    def calculate_batch(
+        self,
+        cadastres: List[Dict[str, Any]],
+        dvfs: List[Dict[str, Any]],
+        visions: List[Dict[str, Any]],
+        dpes: Optional[List[Optional[Dict[str, Any]]]] = None,
+        multi_photo_boost: bool = False,
+        now: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Calcule les estimations d'un lot de biens (portefeuille, backtesting).
+        
+        Surfaces, coefficients, prix et marges sont calculés de façon
+        vectorisée avec NumPy; seule la mise en forme des réponses boucle
+        sur les biens. Résultats identiques à `calculate` appelé bien par bien.
+        
+        Args:
+            cadastres: Données cadastrales de chaque bien
+            dvfs: Statistiques DVF de chaque bien
+            visions: Analyses vision IA de chaque bien
+            dpes: Données DPE de chaque bien (optionnel, None par bien possible)
+            multi_photo_boost: Boost de confiance si photos multiples
+            now: Horodatage de l'estimation (par défaut datetime.now())
+            
+        Returns:
+            Liste des estimations, dans l'ordre des entrées
+        """
+        n = len(cadastres)
+        if dpes is None:
+            dpes = [None] * n
+        if not (len(dvfs) == len(visions) == len(dpes) == n):
+            raise ValueError("Les listes d'entrées doivent avoir la même longueur")
+        if n == 0:
+            return []
+        
+        # 1. Récupérer les données de base
+        surface_terrain = np.array(
+            [c.get("surface_terrain", 0) or 0 for c in cadastres], dtype=np.float64
+        )
+        surface_batie = np.array(
+            [c.get("surface_batie") or 0 for c in cadastres], dtype=np.float64
+        )
+        prix_m2_base = np.array(
+            [d.get("prix_m2_moyen", 3000) for d in dvfs], dtype=np.float64
+        )
+        types_bien = [v.get("type_bien", "maison") for v in visions]
+        coef_etat = np.array(
+            [v.get("coefficient_etat", 1.0) for v in visions], dtype=np.float64
+        )
+        etages = np.array(
+            [v.get("nombre_etages_estime", 1) for v in visions], dtype=np.int64
+        )
+        
+        # 2. Calculer la surface habitable
+        ratio = np.array([self.RATIO_SURFACE.get(t, 0.30) for t in types_bien])
+        defaut = np.array(
+            [self.SURFACE_DEFAUT.get(t, 80) for t in types_bien], dtype=np.float64
+        )
+        is_maison = np.array([t == "maison" for t in types_bien])
+        surface_base = surface_terrain * ratio
+        surface_habitable = np.where(
+            surface_batie > 0,
+            surface_batie * 0.85 * np.maximum(1, etages),
+            np.where(
+                surface_terrain > 0,
+                np.where(is_maison, surface_base * etages * 0.8, surface_base),
+                defaut
+            )
+        )
+        
+        # 3. Calculer les coefficients d'ajustement
+        if now is None:
+            now = datetime.now()
+        now_iso = now.isoformat()
+        coef_etages = np.take(self._ETAGES_TUPLE, np.clip(etages, 0, 5))
+        coef_saison = self._SAISON_TUPLE[now.month - 1]
+        coef_dpe = np.fromiter(
+            (self._get_dpe_coefficient(dpe.get("classe_energie") if dpe else None) for dpe in dpes),
+            dtype=np.float64,
+            count=n
+        )
+        coef_total = coef_etat * coef_etages * coef_saison * coef_dpe
+        
+        # 4-5. Prix ajusté au m² et prix total
+        prix_m2_ajuste = prix_m2_base * coef_total
+        prix_total = surface_habitable * prix_m2_ajuste
+        
+        # 6. Intervalle de confiance
+        marge_erreur = self._calculate_margin_batch(
+            nb_transactions=np.array([d.get("nb_transactions", 0) for d in dvfs]),
+            vision_confidence=np.array(
+                [v.get("score_confiance", 50) for v in visions], dtype=np.float64
+            ),
+            has_dpe=np.array([dpe is not None for dpe in dpes])
+        )
+        prix_bas = prix_total * (1 - marge_erreur)
+        prix_haut = prix_total * (1 + marge_erreur)
+        
+        # 7-10. Mise en forme bien par bien
+        return [
+            self._build_result(
+                cadastres[i], dvfs[i], visions[i], dpes[i],
+                multi_photo_boost=multi_photo_boost,
+                now_iso=now_iso,
+                surface_habitable=rows[0],
+                prix_m2_base=rows[9],
+                prix_m2_ajuste=rows[1],
+                prix_total=rows[2],
+                prix_bas=rows[3],
+                prix_haut=rows[4],
+                marge_erreur=rows[5],
+                coef_etat=rows[10],
+                coef_dpe=rows[6],
+                coef_etages=rows[7],
+                coef_saison=coef_saison,
+                coef_total=rows[8]
+            )
+            for i, rows in enumerate(zip(
+                surface_habitable.tolist(),
+                prix_m2_ajuste.tolist(),
+                prix_total.tolist(),
+                prix_bas.tolist(),
+                prix_haut.tolist(),
+                marge_erreur.tolist(),
+                coef_dpe.tolist(),
+                coef_etages.tolist(),
+                coef_total.tolist(),
+                prix_m2_base.tolist(),
+                coef_etat.tolist()
+            ))
+        ]
+    
+    def _build_result(
+        self,
+        cadastre: Dict[str, Any],
+        dvf: Dict[str, Any],
+        vision: Dict[str, Any],
+        dpe: Optional[Dict[str, Any]],
+        *,
+        multi_photo_boost: bool,
+        now_iso: str,
+        surface_habitable: float,
+        prix_m2_base: float,
+        prix_m2_ajuste: float,
+        prix_total: float,
+        prix_bas: float,
+        prix_haut: float,
+        marge_erreur: float,
+        coef_etat: float,
+        coef_dpe: float,
+        coef_etages: float,
+        coef_saison: float,
+        coef_total: float
+    ) -> Dict[str, Any]:
+        """
+        Construit la réponse d'estimation à partir des valeurs calculées.
+        """
+        # Lecture unique des champs partagés par les étapes 7 à 10
+        nb_transactions = dvf.get("nb_transactions", 0)
+        dvf_source = dvf.get("source")
+        surface_terrain = cadastre.get("surface_terrain", 0)
+        cadastre_source = cadastre.get("source")
+        score_vision = vision.get("score_confiance")
+        classe_dpe = dpe.get("classe_energie") if dpe else None
+        
         # 7. Calculer la confiance globale
         confiance = self._calculate_confidence(
-            dvf=dvf,
-            vision=vision,
-            cadastre=cadastre,
-            dpe=dpe,
+            nb_transactions=nb_transactions,
+            vision_confidence=50 if score_vision is None else score_vision,
+            surface_terrain=surface_terrain,
+            surface_batie=cadastre.get("surface_batie"),
+            annee_construction=cadastre.get("annee_construction"),
+            classe_dpe=classe_dpe,
+            dvf_source=dvf_source or "",
+            cadastre_source=cadastre_source,
             multi_photo=multi_photo_boost
         )
         
         # 8. Déterminer la qualité des données
-        qualite = self._assess_data_quality(cadastre, dvf, vision, dpe)
+        qualite = self._assess_data_quality(
+            nb_transactions=nb_transactions,
+            surface_terrain=surface_terrain,
+            cadastre_source=cadastre_source,
+            vision_confidence=score_vision or 0,
+            classe_dpe=classe_dpe
+        )
         
         # 9. Générer les avertissements
         avertissements = self._generate_warnings(
-            cadastre=cadastre,
-            dvf=dvf,
-            vision=vision,
-            dpe=dpe,
-            prix_total=prix_total
+            nb_transactions=nb_transactions,
+            cadastre_source=cadastre_source,
+            vision_confidence=score_vision or 0,
+            has_dpe=bool(dpe),
+            classe_dpe=classe_dpe,
+            dpe_is_average=bool(dpe and dpe.get("is_average")),
+            prix_m2_moyen=prix_m2_base
         )
         
         # 10. Construire la réponse
@@ -180,16 +397,21 @@ class EstimationEngine:
             "vision": self._format_vision(vision),
             
             # Méta
-            "sources_utilisees": self._list_sources(cadastre, dvf, vision, dpe),
-            "date_estimation": datetime.now().isoformat(),
+            "sources_utilisees": self._list_sources(
+                cadastre_source=cadastre_source,
+                dvf_source=dvf_source,
+                dpe_source=dpe.get("source", "ADEME") if dpe else None,
+                methode_vision=vision.get("details", {}).get("methode")
+            ),
+            "date_estimation": now_iso,
             "avertissements": avertissements,
             
             # Détails calcul (pour debug/transparence)
             "details_calcul": {
                 "coefficient_etat": coef_etat,
                 "coefficient_dpe": coef_dpe,
-                "coefficient_etages": self.COEF_ETAGES.get(min(etages, 5), 1.0),
-                "coefficient_saison": self.COEF_SAISON.get(mois_actuel, 1.0),
+                "coefficient_etages": coef_etages,
+                "coefficient_saison": coef_saison,
                 "coefficient_total": round(coef_total, 3),
                 "marge_erreur_pct": round(marge_erreur * 100, 1)
             }
@@ -223,36 +445,20 @@ class EstimationEngine:
                 return surface_base
         
         # Valeur par défaut si aucune donnée
-        default_surfaces = {
-            "maison": 100,
-            "appartement": 70,
-            "immeuble": 500,
-            "terrain": 0,
-            "local_commercial": 150,
-            "inconnu": 80
-        }
-        
-        return default_surfaces.get(type_bien, 80)
+        return self.SURFACE_DEFAUT.get(type_bien, 80)
     
-    def _get_dpe_coefficient(self, classe: Optional[str]) -> float:
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _get_dpe_coefficient(classe: Optional[str]) -> float:
         """
         Retourne le coefficient d'ajustement selon la classe DPE.
         Impact significatif sur la valeur depuis 2023.
         """
-        coefficients = {
-            "A": 1.08,   # +8%
-            "B": 1.05,   # +5%
-            "C": 1.02,   # +2%
-            "D": 1.00,   # Référence
-            "E": 0.95,   # -5%
-            "F": 0.88,   # -12% (passoire thermique)
-            "G": 0.82,   # -18% (passoire thermique + interdiction location)
-        }
-        return coefficients.get(classe, 1.0)
+        return EstimationEngine.COEF_DPE.get(classe, 1.0)
     
+    @staticmethod
+    @lru_cache(maxsize=1024)
     def _calculate_margin(
-        self,
-        ecart_type: float,
         nb_transactions: int,
         vision_confidence: float,
         has_dpe: bool
@@ -284,12 +490,40 @@ class EstimationEngine:
         # Bornes
         return max(0.08, min(0.30, marge))
     
+    def _calculate_margin_batch(
+        self,
+        nb_transactions: np.ndarray,
+        vision_confidence: np.ndarray,
+        has_dpe: np.ndarray
+    ) -> np.ndarray:
+        """
+        Version vectorisée de `_calculate_margin` pour un lot de biens.
+        """
+        marge = 0.15 - np.select(
+            [nb_transactions >= 20, nb_transactions >= 10, nb_transactions == 0],
+            [0.03, 0.02, -0.05],
+            0.0
+        )
+        marge = marge - np.select(
+            [vision_confidence >= 80, vision_confidence < 50],
+            [0.02, -0.03],
+            0.0
+        )
+        marge = marge - np.where(has_dpe, 0.02, 0.0)
+        
+        return np.clip(marge, 0.08, 0.30)
+    
     def _calculate_confidence(
         self,
-        dvf: Dict,
-        vision: Dict,
-        cadastre: Dict,
-        dpe: Optional[Dict],
+        *,
+        nb_transactions: int,
+        vision_confidence: float,
+        surface_terrain: float,
+        surface_batie: Optional[float],
+        annee_construction: Optional[int],
+        classe_dpe: Optional[str],
+        dvf_source: str,
+        cadastre_source: Optional[str],
         multi_photo: bool
     ) -> float:
         """
@@ -298,30 +532,28 @@ class EstimationEngine:
         score = 40  # Base
         
         # DVF: nombre de transactions
-        nb_trans = dvf.get("nb_transactions", 0)
-        if nb_trans >= 20:
+        if nb_transactions >= 20:
             score += 20
-        elif nb_trans >= 10:
+        elif nb_transactions >= 10:
             score += 15
-        elif nb_trans >= 5:
+        elif nb_transactions >= 5:
             score += 10
-        elif nb_trans > 0:
+        elif nb_transactions > 0:
             score += 5
         
         # Vision: confiance
-        vision_conf = vision.get("score_confiance", 50)
-        score += (vision_conf - 50) * 0.2  # ±10 points
+        score += (vision_confidence - 50) * 0.2  # ±10 points
         
         # Cadastre: données disponibles
-        if cadastre.get("surface_terrain", 0) > 0:
+        if surface_terrain > 0:
             score += 5
-        if cadastre.get("surface_batie"):
+        if surface_batie:
             score += 5
-        if cadastre.get("annee_construction"):
+        if annee_construction:
             score += 3
         
         # DPE
-        if dpe and dpe.get("classe_energie"):
+        if classe_dpe:
             score += 7
         
         # Multi-photos
@@ -329,19 +561,21 @@ class EstimationEngine:
             score += 5
         
         # Pénalité si données manquantes
-        if dvf.get("source", "").startswith("Estimation"):
+        if dvf_source.startswith("Estimation"):
             score -= 10
-        if cadastre.get("source") == "fallback":
+        if cadastre_source == "fallback":
             score -= 10
         
         return max(15, min(95, score))
     
     def _assess_data_quality(
         self,
-        cadastre: Dict,
-        dvf: Dict,
-        vision: Dict,
-        dpe: Optional[Dict]
+        *,
+        nb_transactions: int,
+        surface_terrain: float,
+        cadastre_source: Optional[str],
+        vision_confidence: float,
+        classe_dpe: Optional[str]
     ) -> str:
         """
         Évalue la qualité globale des données.
@@ -350,25 +584,25 @@ class EstimationEngine:
         max_points = 10
         
         # DVF
-        if dvf.get("nb_transactions", 0) >= 10:
+        if nb_transactions >= 10:
             points += 3
-        elif dvf.get("nb_transactions", 0) > 0:
+        elif nb_transactions > 0:
             points += 1
         
         # Cadastre
-        if cadastre.get("surface_terrain", 0) > 0:
+        if surface_terrain > 0:
             points += 2
-        if cadastre.get("source") != "fallback":
+        if cadastre_source != "fallback":
             points += 1
         
         # Vision
-        if vision.get("score_confiance", 0) >= 70:
+        if vision_confidence >= 70:
             points += 2
-        elif vision.get("score_confiance", 0) >= 50:
+        elif vision_confidence >= 50:
             points += 1
         
         # DPE
-        if dpe and dpe.get("classe_energie"):
+        if classe_dpe:
             points += 2
         
         ratio = points / max_points
@@ -386,11 +620,14 @@ class EstimationEngine:
     
     def _generate_warnings(
         self,
-        cadastre: Dict,
-        dvf: Dict,
-        vision: Dict,
-        dpe: Optional[Dict],
-        prix_total: float
+        *,
+        nb_transactions: int,
+        cadastre_source: Optional[str],
+        vision_confidence: float,
+        has_dpe: bool,
+        classe_dpe: Optional[str],
+        dpe_is_average: bool,
+        prix_m2_moyen: float
     ) -> List[str]:
         """
         Génère des avertissements pour l'utilisateur.
@@ -398,39 +635,38 @@ class EstimationEngine:
         warnings = []
         
         # DVF
-        if dvf.get("nb_transactions", 0) == 0:
+        if nb_transactions == 0:
             warnings.append(
                 "⚠️ Aucune transaction récente dans le secteur - "
                 "estimation basée sur les moyennes régionales"
             )
-        elif dvf.get("nb_transactions", 0) < 5:
+        elif nb_transactions < 5:
             warnings.append(
                 "⚠️ Peu de transactions comparables - précision limitée"
             )
         
         # Cadastre
-        if cadastre.get("source") == "fallback":
+        if cadastre_source == "fallback":
             warnings.append(
                 "⚠️ Données cadastrales non disponibles - "
                 "surface estimée par analyse visuelle"
             )
         
         # Vision
-        if vision.get("score_confiance", 0) < 50:
+        if vision_confidence < 50:
             warnings.append(
                 "⚠️ Qualité d'image insuffisante - "
                 "ajoutez des photos supplémentaires pour améliorer l'estimation"
             )
         
         # DPE
-        if dpe:
-            classe = dpe.get("classe_energie")
-            if classe in ["F", "G"]:
+        if has_dpe:
+            if classe_dpe in ("F", "G"):
                 warnings.append(
-                    f"⚠️ Passoire thermique (DPE {classe}) - "
+                    f"⚠️ Passoire thermique (DPE {classe_dpe}) - "
                     "le bien nécessitera des travaux de rénovation énergétique"
                 )
-            if dpe.get("is_average"):
+            if dpe_is_average:
                 warnings.append(
                     "ℹ️ DPE basé sur la moyenne du quartier - "
                     "un DPE réel peut modifier significativement l'estimation"
@@ -442,13 +678,12 @@ class EstimationEngine:
             )
         
         # Prix atypique
-        prix_m2 = dvf.get("prix_m2_moyen", 3000)
-        if prix_m2 < 1000:
+        if prix_m2_moyen < 1000:
             warnings.append(
                 "ℹ️ Zone à prix très bas - vérifiez les opportunités "
                 "mais aussi les contraintes locales"
             )
-        elif prix_m2 > 8000:
+        elif prix_m2_moyen > 8000:
             warnings.append(
                 "ℹ️ Zone à prix élevé - le marché peut être volatile"
             )
@@ -501,22 +736,23 @@ class EstimationEngine:
     
     def _list_sources(
         self,
-        cadastre: Dict,
-        dvf: Dict,
-        vision: Dict,
-        dpe: Optional[Dict]
+        *,
+        cadastre_source: Optional[str],
+        dvf_source: Optional[str],
+        dpe_source: Optional[str],
+        methode_vision: Optional[str]
     ) -> List[str]:
         """Liste les sources utilisées pour l'estimation."""
         sources = []
         
-        if cadastre.get("source") != "fallback":
-            sources.append(f"Cadastre ({cadastre.get('source', 'APICarto IGN')})")
+        if cadastre_source != "fallback":
+            sources.append(f"Cadastre ({cadastre_source or 'APICarto IGN'})")
         
-        sources.append(f"DVF ({dvf.get('source', 'Etalab')})")
+        sources.append(f"DVF ({dvf_source or 'Etalab'})")
         
-        if dpe:
-            sources.append(f"DPE ({dpe.get('source', 'ADEME')})")
+        if dpe_source:
+            sources.append(f"DPE ({dpe_source})")
         
-        sources.append(f"Vision IA ({vision.get('details', {}).get('methode', 'heuristic')})")
+        sources.append(f"Vision IA ({methode_vision or 'heuristic'})")
         
         return sources
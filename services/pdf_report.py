@@ -3,21 +3,54 @@ Générateur de Rapport PDF - EstimImmo AI
 Produit un rapport d'estimation professionnel au format PDF
 """
 
+import asyncio
+import copy
+import logging
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache, partial
+from itertools import chain, islice
+from typing import Dict, Any, Optional
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm, mm
+from reportlab.lib.units import cm
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
-    Image, PageBreak, HRFlowable
+    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable,
+    ListFlowable, ListItem
 )
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
+from reportlab.lib.enums import TA_CENTER
 from io import BytesIO
 
 
+logger = logging.getLogger(__name__)
+
+
+# Séparateur de milliers: espace insécable (U+00A0, présent dans l'encodage
+# WinAnsi des polices standard, contrairement à l'espace fine U+202F)
+_THOUSANDS_TRANS = str.maketrans({",": "\u00a0"})
+
+
+def _fmt_eur(x: float) -> str:
+    """Formate un nombre arrondi à l'unité avec séparateur de milliers."""
+    return f"{x:,.0f}".translate(_THOUSANDS_TRANS)
+
+
+# Lignes du tableau récapitulatif: (clé, libellé, format, valeur par défaut)
+_SUMMARY_FIELDS = (
+    ("surface_terrain", "Surface terrain", "{:,.0f} m²", 0),
+    ("surface_habitable_estimee", "Surface habitable estimée", "{:,.0f} m²", 0),
+    ("prix_m2_secteur", "Prix au m² secteur", "{:,.0f} €/m²", 0),
+    ("prix_m2_ajuste", "Prix au m² ajusté", "{:,.0f} €/m²", 0),
+    ("confiance", "Confiance", "{:.0f}%", 0),
+    ("qualite_donnees", "Qualité des données", "{}", "N/A"),
+)
+
+
 class PDFReportGenerator:
     """
     Générateur de rapports PDF professionnels pour les estimations immobilières.
@@ -33,6 +66,115 @@ class PDFReportGenerator:
     TEXT_COLOR = colors.HexColor("#2C3E50")  # Gris foncé
     LIGHT_BG = colors.HexColor("#F8F9FA")  # Gris très clair
     
+    # Styles de tableaux (identiques d'un rapport à l'autre) - récapitulatif
+    _SUMMARY_TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), LIGHT_BG),
+        ('TEXTCOLOR', (0, 0), (-1, -1), TEXT_COLOR),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
+    ])
+    
+    # Statistiques DVF
+    _DVF_TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -1), TEXT_COLOR),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
+    ])
+    
+    # Transactions récentes
+    _TRANS_TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), SECONDARY_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6)
+    ])
+    
+    # Tableau DPE
+    _DPE_TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), LIGHT_BG),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8)
+    ])
+    
+    # Mise en page du document, commune à tous les rapports
+    PAGE_LAYOUT = {
+        "pagesize": A4,
+        "rightMargin": 2*cm,
+        "leftMargin": 2*cm,
+        "topMargin": 2*cm,
+        "bottomMargin": 2*cm,
+        "pageCompression": 1,  # Flux de page compressés (zlib)
+        "invariant": 1,        # Sortie déterministe à contenu identique
+    }
+    
+    # Hauteur réservée en haut de la première page pour l'en-tête
+    HEADER_HEIGHT = 138
+    
+    # Avertissement légal (pied de page)
+    DISCLAIMER = """
+        <b>Avertissement légal :</b> Cette estimation est fournie à titre indicatif uniquement 
+        et ne constitue pas une évaluation officielle. Les valeurs réelles peuvent varier 
+        significativement en fonction de facteurs non pris en compte dans cette analyse 
+        (état intérieur détaillé, travaux récents, spécificités locales, etc.). 
+        Pour une évaluation précise, consultez un expert immobilier agréé.
+        """
+    
+    # Textes identiques d'un rapport à l'autre: (texte, style)
+    STATIC_TEXTS = {
+        "section_details": ("Détails du Bien", "SectionTitle"),
+        "section_market": ("Analyse du Marché Local", "SectionTitle"),
+        "section_dpe": ("Performance Énergétique", "SectionTitle"),
+        "section_methodology": ("Méthodologie", "SectionTitle"),
+        "section_warnings": ("Points d'Attention", "SectionTitle"),
+        "cadastre_heading": ("<b>Informations cadastrales</b>", "BodyText"),
+        "vision_heading": ("<b>Analyse visuelle (IA)</b>", "BodyText"),
+        "transactions_heading": ("<b>Transactions récentes comparables</b>", "BodyText"),
+        "methodology_intro": (
+            "Cette estimation a été calculée en combinant plusieurs sources de données :",
+            "BodyText"
+        ),
+        "coefficients_heading": ("<b>Coefficients appliqués :</b>", "BodyText"),
+        "disclaimer": (DISCLAIMER, "SmallText"),
+    }
+    
+    # Feuille de styles et paragraphes statiques partagés,
+    # construits une seule fois par process
+    _STYLES = None
+    _STATIC_PARAGRAPHS = None
+    _STYLES_LOCK = threading.Lock()
+    
+    # Répertoires de sortie déjà créés dans ce process
+    _ENSURED_DIRS = set()
+    _DIRS_LOCK = threading.Lock()
+    
+    # Pool de processus préchauffés pour generate_async: créé au premier
+    # rapport puis conservé jusqu'à close(). La mise en page reportlab est
+    # en pur Python, seuls des processus contournent le GIL.
+    POOL_PROCESSES = min(4, os.cpu_count() or 1)
+    _POOL: Optional[ProcessPoolExecutor] = None
+    _POOL_LOCK = threading.Lock()
+    
     def __init__(self, output_dir: str = "/tmp/estimmo_reports"):
         """
         Initialise le générateur.
@@ -41,88 +183,99 @@ class PDFReportGenerator:
             output_dir: Répertoire de sortie pour les PDFs
         """
         self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
+        self._ensure_dir(output_dir)
         
-        # Initialiser les styles
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
+        # Styles partagés entre toutes les instances
+        self.styles = type(self)._get_styles()
+    
+    @classmethod
+    def _ensure_dir(cls, output_dir: str):
+        """Crée le répertoire de sortie une seule fois par process."""
+        if output_dir in cls._ENSURED_DIRS:
+            return
+        with cls._DIRS_LOCK:
+            if output_dir not in cls._ENSURED_DIRS:
+                os.makedirs(output_dir, exist_ok=True)
+                cls._ENSURED_DIRS.add(output_dir)
+    
+    @classmethod
+    def _get_styles(cls):
+        """Retourne la feuille de styles, construite au premier appel."""
+        if cls._STYLES is None:
+            with cls._STYLES_LOCK:
+                if cls._STYLES is None:
+                    styles = getSampleStyleSheet()
+                    cls._setup_custom_styles(styles)
+                    cls._STATIC_PARAGRAPHS = {
+                        key: Paragraph(text, styles[style])
+                        for key, (text, style) in cls.STATIC_TEXTS.items()
+                    }
+                    cls._STYLES = styles
+        return cls._STYLES
+    
+    def _static_paragraph(self, key: str) -> Paragraph:
+        """
+        Retourne un paragraphe statique pré-analysé.
+        La copie superficielle partage le balisage déjà analysé, mais garde
+        son propre état de mise en page (wrap) pour chaque document.
+        """
+        return copy.copy(self._STATIC_PARAGRAPHS[key])
     
-    def _setup_custom_styles(self):
+    def _bullet_list(self, items) -> ListFlowable:
+        """Construit une liste à puces (puce dessinée par reportlab)."""
+        style = self.styles['BodyText']
+        return ListFlowable(
+            [ListItem(Paragraph(item, style)) for item in items],
+            bulletType='bullet',
+            start='•',
+            bulletFontSize=style.fontSize,
+            leftIndent=10
+        )
+    
+    @classmethod
+    def _setup_custom_styles(cls, styles):
         """Configure les styles personnalisés."""
         
-        # Titre principal
-        self.styles.add(ParagraphStyle(
-            name='MainTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            textColor=self.PRIMARY_COLOR,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        ))
-        
-        # Sous-titre
-        self.styles.add(ParagraphStyle(
-            name='SubTitle',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            textColor=self.SECONDARY_COLOR,
-            spaceAfter=15,
-            alignment=TA_CENTER,
-            fontName='Helvetica'
-        ))
-        
         # Section
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='SectionTitle',
-            parent=self.styles['Heading2'],
+            parent=styles['Heading2'],
             fontSize=14,
-            textColor=self.PRIMARY_COLOR,
+            textColor=cls.PRIMARY_COLOR,
             spaceBefore=15,
             spaceAfter=10,
             fontName='Helvetica-Bold',
-            borderColor=self.PRIMARY_COLOR,
+            borderColor=cls.PRIMARY_COLOR,
             borderWidth=0,
             borderPadding=5
         ))
         
-        # Corps de texte
-        self.styles.add(ParagraphStyle(
-            name='BodyTextCustom',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            textColor=self.TEXT_COLOR,
-            spaceAfter=8,
-            alignment=TA_JUSTIFY,
-            fontName='Helvetica'
-        ))
-        
         # Prix principal
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='MainPrice',
-            parent=self.styles['Normal'],
+            parent=styles['Normal'],
             fontSize=28,
-            textColor=self.PRIMARY_COLOR,
+            textColor=cls.PRIMARY_COLOR,
             alignment=TA_CENTER,
             fontName='Helvetica-Bold',
             spaceAfter=5
         ))
         
         # Petit texte
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='SmallText',
-            parent=self.styles['Normal'],
+            parent=styles['Normal'],
             fontSize=8,
             textColor=colors.gray,
             alignment=TA_CENTER
         ))
         
         # Avertissement
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='Warning',
-            parent=self.styles['Normal'],
+            parent=styles['Normal'],
             fontSize=9,
-            textColor=self.WARNING_COLOR,
+            textColor=cls.WARNING_COLOR,
             spaceAfter=5,
             fontName='Helvetica-Oblique'
         ))
@@ -137,89 +290,168 @@ class PDFReportGenerator:
         Returns:
             Chemin du fichier PDF généré
         """
-        # Nom du fichier
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"estimation_{timestamp}.pdf"
-        filepath = os.path.join(self.output_dir, filename)
-        
-        # Créer le document
-        doc = SimpleDocTemplate(
-            filepath,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
-        )
-        
-        # Contenu
-        story = []
-        
-        # 1. En-tête
-        story.extend(self._build_header(estimation))
-        
-        # 2. Résumé de l'estimation
-        story.extend(self._build_summary(estimation))
+        # Horodatage unique (nom du fichier, en-tête et pied de page)
+        now = datetime.now()
+        buffer = self._build_pdf(estimation, now)
+        return self._write_report(buffer.getbuffer(), now)
+    
+    async def generate_async(self, estimation: Dict[str, Any]) -> str:
+        """
+        Variante asynchrone de generate(): le PDF est construit dans un
+        worker du pool de processus, hors de la boucle d'événements.
         
-        # 3. Détails du bien
-        story.extend(self._build_property_details(estimation))
+        Args:
+            estimation: Résultats de l'estimation
+            
+        Returns:
+            Chemin du fichier PDF généré
+        """
+        now = datetime.now()
+        loop = asyncio.get_running_loop()
+        try:
+            content = await loop.run_in_executor(
+                self._get_pool(), _build_in_worker, estimation, now
+            )
+        except BrokenProcessPool as e:
+            # Worker perdu (mémoire, signal): pool recréé au prochain
+            # rapport, celui-ci est construit dans un thread
+            logger.warning("Pool PDF indisponible: %s", e)
+            self._shutdown_pool()
+            content = await asyncio.to_thread(
+                lambda: self._build_pdf(estimation, now).getvalue()
+            )
+        
+        return await asyncio.to_thread(self._write_report, content, now)
+    
+    def _write_report(self, content, now: datetime) -> str:
+        """Écrit le PDF en un seul appel, nommé d'après son horodatage."""
+        filename = f"estimation_{now.strftime('%Y%m%d_%H%M%S')}.pdf"
+        filepath = os.path.join(self.output_dir, filename)
+        with open(filepath, "wb") as f:
+            f.write(content)
+        return filepath
+    
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        """Retourne le pool de workers, créé au premier appel."""
+        if cls._POOL is None:
+            with cls._POOL_LOCK:
+                if cls._POOL is None:
+                    # spawn: pas de fork d'un process qui exécute déjà des
+                    # threads (journalisation, pools d'exécution)
+                    cls._POOL = ProcessPoolExecutor(
+                        max_workers=cls.POOL_PROCESSES,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_warm_worker
+                    )
+        return cls._POOL
+    
+    @classmethod
+    def _shutdown_pool(cls):
+        """Arrête le pool de workers (recréé au besoin)."""
+        with cls._POOL_LOCK:
+            pool, cls._POOL = cls._POOL, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    async def close(self):
+        """Arrête le pool de workers (arrêt de l'application)."""
+        await asyncio.to_thread(self._shutdown_pool)
+    
+    def generate_bytes(self, estimation: Dict[str, Any]) -> bytes:
+        """
+        Génère un rapport PDF complet en mémoire, sans passer par le disque.
         
-        # 4. Analyse du marché
-        story.extend(self._build_market_analysis(estimation))
+        Args:
+            estimation: Résultats de l'estimation
+            
+        Returns:
+            Contenu du PDF
+        """
+        return self._build_pdf(estimation, datetime.now()).getvalue()
+    
+    def _build_pdf(self, estimation: Dict[str, Any], now: datetime) -> BytesIO:
+        """Construit le PDF dans un tampon mémoire."""
+        buffer = BytesIO()
         
-        # 5. Performance énergétique
+        # Créer le document
+        doc = SimpleDocTemplate(buffer, **self.PAGE_LAYOUT)
+        
+        # Sections du rapport, dans l'ordre (DPE et avertissements optionnels).
+        # L'en-tête et la ligne de pied de page sont dessinés directement sur
+        # le canevas (position fixe), hors du moteur de mise en page Platypus.
+        sections = [
+            self._build_summary,             # 2. Résumé de l'estimation
+            self._build_property_details,    # 3. Détails du bien
+            self._build_market_analysis,     # 4. Analyse du marché
+        ]
         if estimation.get("dpe"):
-            story.extend(self._build_dpe_section(estimation))
-        
-        # 6. Méthodologie
-        story.extend(self._build_methodology(estimation))
-        
-        # 7. Avertissements
+            sections.append(self._build_dpe_section)  # 5. Performance énergétique
+        sections.append(self._build_methodology)      # 6. Méthodologie
         if estimation.get("avertissements"):
-            story.extend(self._build_warnings(estimation))
+            sections.append(self._build_warnings)     # 7. Avertissements
+        sections.append(self._build_footer)           # 8. Avertissement légal
         
-        # 8. Pied de page
-        story.extend(self._build_footer(estimation))
+        # Contenu, sous l'emplacement réservé à l'en-tête (1.)
+        story = list(chain(
+            [Spacer(1, self.HEADER_HEIGHT)],
+            chain.from_iterable(build_section(estimation) for build_section in sections)
+        ))
         
         # Générer le PDF
-        doc.build(story)
+        doc.build(
+            story,
+            onFirstPage=partial(self._draw_first_page, now=now),
+            onLaterPages=partial(self._draw_page_footer, now=now)
+        )
         
-        return filepath
+        return buffer
     
-    def _build_header(self, estimation: Dict) -> list:
-        """Construit l'en-tête du rapport."""
-        elements = []
+    def _draw_first_page(self, canvas, doc, now: datetime):
+        """Dessine l'en-tête du rapport (première page) et le pied de page."""
+        canvas.saveState()
+        
+        x = doc.leftMargin + doc.width / 2
+        y = doc.pagesize[1] - doc.topMargin
         
         # Logo/Titre
-        elements.append(Paragraph(
-            "ESTIMMO AI",
-            self.styles['MainTitle']
-        ))
+        y -= 30
+        canvas.setFont("Helvetica-Bold", 24)
+        canvas.setFillColor(self.PRIMARY_COLOR)
+        canvas.drawCentredString(x, y, "ESTIMMO AI")
         
-        elements.append(Paragraph(
-            "Rapport d'Estimation Immobilière",
-            self.styles['SubTitle']
-        ))
+        y -= 34
+        canvas.setFont("Helvetica", 14)
+        canvas.setFillColor(self.SECONDARY_COLOR)
+        canvas.drawCentredString(x, y, "Rapport d'Estimation Immobilière")
         
         # Date
-        date_str = datetime.now().strftime("%d/%m/%Y à %H:%M")
-        elements.append(Paragraph(
-            f"Généré le {date_str}",
-            self.styles['SmallText']
-        ))
-        
-        elements.append(Spacer(1, 20))
+        y -= 30
+        canvas.setFont("Helvetica", 8)
+        canvas.setFillColor(colors.gray)
+        canvas.drawCentredString(x, y, f"Généré le {now.strftime('%d/%m/%Y à %H:%M')}")
         
         # Ligne de séparation
-        elements.append(HRFlowable(
-            width="100%",
-            thickness=2,
-            color=self.PRIMARY_COLOR,
-            spaceBefore=5,
-            spaceAfter=20
-        ))
+        y -= 31
+        canvas.setStrokeColor(self.PRIMARY_COLOR)
+        canvas.setLineWidth(2)
+        canvas.line(doc.leftMargin, y, doc.leftMargin + doc.width, y)
         
-        return elements
+        canvas.restoreState()
+        
+        self._draw_page_footer(canvas, doc, now=now)
+    
+    def _draw_page_footer(self, canvas, doc, now: datetime):
+        """Dessine la ligne de pied de page, identique sur chaque page."""
+        canvas.saveState()
+        canvas.setFont("Helvetica", 8)
+        canvas.setFillColor(colors.gray)
+        canvas.drawCentredString(
+            doc.leftMargin + doc.width / 2,
+            doc.bottomMargin / 2,
+            f"Rapport généré par EstimImmo AI - {now.strftime('%d/%m/%Y %H:%M')}"
+        )
+        canvas.restoreState()
     
     def _build_summary(self, estimation: Dict) -> list:
         """Construit le résumé de l'estimation."""
@@ -228,7 +460,7 @@ class PDFReportGenerator:
         # Prix principal
         prix = estimation.get("prix_total_estime", 0)
         elements.append(Paragraph(
-            f"{prix:,.0f} €".replace(",", " "),
+            f"{_fmt_eur(prix)} €",
             self.styles['MainPrice']
         ))
         
@@ -236,7 +468,7 @@ class PDFReportGenerator:
         prix_bas = estimation.get("prix_bas", 0)
         prix_haut = estimation.get("prix_haut", 0)
         elements.append(Paragraph(
-            f"Fourchette : {prix_bas:,.0f} € - {prix_haut:,.0f} €".replace(",", " "),
+            f"Fourchette : {_fmt_eur(prix_bas)} € - {_fmt_eur(prix_haut)} €",
             self.styles['SmallText']
         ))
         
@@ -244,27 +476,12 @@ class PDFReportGenerator:
         
         # Tableau récapitulatif
         data = [
-            ["Surface terrain", f"{estimation.get('surface_terrain', 0):,.0f} m²".replace(",", " ")],
-            ["Surface habitable estimée", f"{estimation.get('surface_habitable_estimee', 0):,.0f} m²".replace(",", " ")],
-            ["Prix au m² secteur", f"{estimation.get('prix_m2_secteur', 0):,.0f} €/m²".replace(",", " ")],
-            ["Prix au m² ajusté", f"{estimation.get('prix_m2_ajuste', 0):,.0f} €/m²".replace(",", " ")],
-            ["Confiance", f"{estimation.get('confiance', 0):.0f}%"],
-            ["Qualité des données", estimation.get('qualite_donnees', 'N/A')]
+            [label, fmt.format(estimation.get(key, default)).translate(_THOUSANDS_TRANS)]
+            for key, label, fmt, default in _SUMMARY_FIELDS
         ]
         
         table = Table(data, colWidths=[8*cm, 6*cm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), self.LIGHT_BG),
-            ('TEXTCOLOR', (0, 0), (-1, -1), self.TEXT_COLOR),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
-        ]))
+        table.setStyle(self._SUMMARY_TABLE_STYLE)
         
         elements.append(table)
         elements.append(Spacer(1, 20))
@@ -275,19 +492,13 @@ class PDFReportGenerator:
         """Construit la section détails du bien."""
         elements = []
         
-        elements.append(Paragraph(
-            "📋 Détails du Bien",
-            self.styles['SectionTitle']
-        ))
+        elements.append(self._static_paragraph("section_details"))
         
         cadastre = estimation.get("cadastre", {})
         vision = estimation.get("vision", {})
         
         # Informations cadastrales
-        elements.append(Paragraph(
-            "<b>Informations cadastrales</b>",
-            self.styles['BodyText']
-        ))
+        elements.append(self._static_paragraph("cadastre_heading"))
         
         cadastre_info = []
         if cadastre.get("commune"):
@@ -299,16 +510,13 @@ class PDFReportGenerator:
         if cadastre.get("annee_construction"):
             cadastre_info.append(f"Année de construction : {cadastre['annee_construction']}")
         
-        for info in cadastre_info:
-            elements.append(Paragraph(f"• {info}", self.styles['BodyText']))
+        if cadastre_info:
+            elements.append(self._bullet_list(cadastre_info))
         
         elements.append(Spacer(1, 10))
         
         # Analyse visuelle
-        elements.append(Paragraph(
-            "<b>Analyse visuelle (IA)</b>",
-            self.styles['BodyText']
-        ))
+        elements.append(self._static_paragraph("vision_heading"))
         
         vision_info = [
             f"Type de bien : {vision.get('type_bien', 'Non déterminé')}",
@@ -317,8 +525,7 @@ class PDFReportGenerator:
             f"Confiance de l'analyse : {vision.get('score_confiance', 0):.0f}%"
         ]
         
-        for info in vision_info:
-            elements.append(Paragraph(f"• {info}", self.styles['BodyText']))
+        elements.append(self._bullet_list(vision_info))
         
         elements.append(Spacer(1, 15))
         
@@ -328,69 +535,37 @@ class PDFReportGenerator:
         """Construit la section analyse du marché."""
         elements = []
         
-        elements.append(Paragraph(
-            "📊 Analyse du Marché Local",
-            self.styles['SectionTitle']
-        ))
+        elements.append(self._static_paragraph("section_market"))
         
         dvf = estimation.get("dvf", {})
         
         # Statistiques
-        data = [
-            ["Indicateur", "Valeur"],
-            ["Prix moyen au m²", f"{dvf.get('prix_m2_moyen', 0):,.0f} €".replace(",", " ")],
-            ["Prix médian au m²", f"{dvf.get('prix_m2_median', 0):,.0f} €".replace(",", " ")],
-            ["Transactions analysées", str(dvf.get('nb_transactions', 0))],
-            ["Période", dvf.get('periode', 'N/A')]
-        ]
-        
-        table = Table(data, colWidths=[7*cm, 5*cm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), self.PRIMARY_COLOR),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), self.TEXT_COLOR),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
-        ]))
-        
-        elements.append(table)
+        elements.append(self._table(
+            self._dvf_stats_rows(
+                dvf.get('prix_m2_moyen', 0),
+                dvf.get('prix_m2_median', 0),
+                dvf.get('nb_transactions', 0),
+                dvf.get('periode', 'N/A')
+            ),
+            [7*cm, 5*cm],
+            self._DVF_TABLE_STYLE
+        ))
         
         # Transactions récentes
         transactions = dvf.get('transactions_detail', [])
         if transactions:
             elements.append(Spacer(1, 10))
-            elements.append(Paragraph(
-                "<b>Transactions récentes comparables</b>",
-                self.styles['BodyText']
-            ))
-            
-            trans_data = [["Date", "Surface", "Prix", "Prix/m²"]]
-            for t in transactions[:5]:
-                trans_data.append([
-                    t.get('date', 'N/A')[:10] if t.get('date') else 'N/A',
-                    f"{t.get('surface', 0):.0f} m²",
-                    f"{t.get('prix', 0):,.0f} €".replace(",", " "),
-                    f"{t.get('prix_m2', 0):,.0f} €".replace(",", " ")
-                ])
+            elements.append(self._static_paragraph("transactions_heading"))
             
-            trans_table = Table(trans_data, colWidths=[3*cm, 3*cm, 4*cm, 3*cm])
-            trans_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), self.SECONDARY_COLOR),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 6)
-            ]))
-            
-            elements.append(trans_table)
+            rows = tuple(
+                (t.get('date'), t.get('surface', 0), t.get('prix', 0), t.get('prix_m2', 0))
+                for t in islice(transactions, 5)
+            )
+            elements.append(self._table(
+                self._transactions_rows(rows),
+                [3*cm, 3*cm, 4*cm, 3*cm],
+                self._TRANS_TABLE_STYLE
+            ))
         
         elements.append(Spacer(1, 15))
         
@@ -400,70 +575,89 @@ class PDFReportGenerator:
         """Construit la section DPE."""
         elements = []
         
-        elements.append(Paragraph(
-            "🌿 Performance Énergétique",
-            self.styles['SectionTitle']
-        ))
+        elements.append(self._static_paragraph("section_dpe"))
         
         dpe = estimation.get("dpe", {})
         
-        classe_energie = dpe.get("classe_energie", "N/A")
-        classe_ges = dpe.get("classe_ges", "N/A")
-        
-        # Couleurs DPE
-        dpe_colors = {
-            "A": "#319834", "B": "#33CC31", "C": "#CBFC34",
-            "D": "#FCFC32", "E": "#FCCC00", "F": "#FC9900", "G": "#FC0000"
-        }
-        
-        data = [
-            ["Classe énergie", classe_energie],
-            ["Classe GES", classe_ges],
-            ["Consommation", f"{dpe.get('consommation_energie', 'N/A')} kWh/m²/an" if dpe.get('consommation_energie') else "N/A"],
-            ["Émissions GES", f"{dpe.get('estimation_ges', 'N/A')} kgCO₂/m²/an" if dpe.get('estimation_ges') else "N/A"]
-        ]
-        
-        table = Table(data, colWidths=[6*cm, 6*cm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), self.LIGHT_BG),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8)
-        ]))
-        
-        elements.append(table)
+        elements.append(self._table(
+            self._dpe_rows(
+                dpe.get("classe_energie", "N/A"),
+                dpe.get("classe_ges", "N/A"),
+                dpe.get("consommation_energie"),
+                dpe.get("estimation_ges")
+            ),
+            [6*cm, 6*cm],
+            self._DPE_TABLE_STYLE
+        ))
         elements.append(Spacer(1, 15))
         
         return elements
     
+    @staticmethod
+    def _table(rows: tuple, col_widths: list, style: TableStyle) -> Table:
+        """Construit un tableau neuf (état de mise en page propre au document)."""
+        table = Table([list(row) for row in rows], colWidths=col_widths)
+        table.setStyle(style)
+        return table
+    
+    # Cellules mémoïsées par contenu: des rapports d'un même secteur partagent
+    # souvent les mêmes statistiques DVF. Seules les données (tuples immuables)
+    # sont partagées, chaque rapport construit ses propres tableaux.
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _dvf_stats_rows(prix_m2_moyen, prix_m2_median, nb_transactions, periode) -> tuple:
+        """Cellules du tableau des statistiques DVF du secteur."""
+        return (
+            ("Indicateur", "Valeur"),
+            ("Prix moyen au m²", f"{_fmt_eur(prix_m2_moyen)} €"),
+            ("Prix médian au m²", f"{_fmt_eur(prix_m2_median)} €"),
+            ("Transactions analysées", str(nb_transactions)),
+            ("Période", periode)
+        )
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _transactions_rows(rows: tuple) -> tuple:
+        """Cellules du tableau des transactions comparables, rows: (date, surface, prix, prix_m2)."""
+        return (("Date", "Surface", "Prix", "Prix/m²"),) + tuple(
+            (
+                date[:10] if date else 'N/A',
+                f"{surface:.0f} m²",
+                f"{_fmt_eur(prix)} €",
+                f"{_fmt_eur(prix_m2)} €"
+            )
+            for date, surface, prix, prix_m2 in rows
+        )
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _dpe_rows(classe_energie, classe_ges, consommation_energie, estimation_ges) -> tuple:
+        """Cellules du tableau de performance énergétique."""
+        return (
+            ("Classe énergie", classe_energie),
+            ("Classe GES", classe_ges),
+            ("Consommation", f"{consommation_energie} kWh/m²/an" if consommation_energie else "N/A"),
+            ("Émissions GES", f"{estimation_ges} kgCO₂/m²/an" if estimation_ges else "N/A")
+        )
+    
     def _build_methodology(self, estimation: Dict) -> list:
         """Construit la section méthodologie."""
         elements = []
         
-        elements.append(Paragraph(
-            "📐 Méthodologie",
-            self.styles['SectionTitle']
-        ))
+        elements.append(self._static_paragraph("section_methodology"))
         
-        elements.append(Paragraph(
-            "Cette estimation a été calculée en combinant plusieurs sources de données :",
-            self.styles['BodyText']
-        ))
+        elements.append(self._static_paragraph("methodology_intro"))
         
-        for source in estimation.get("sources_utilisees", []):
-            elements.append(Paragraph(f"• {source}", self.styles['BodyText']))
+        sources = estimation.get("sources_utilisees", [])
+        if sources:
+            elements.append(self._bullet_list(sources))
         
         # Détails du calcul
         details = estimation.get("details_calcul", {})
         if details:
             elements.append(Spacer(1, 10))
-            elements.append(Paragraph(
-                "<b>Coefficients appliqués :</b>",
-                self.styles['BodyText']
-            ))
+            elements.append(self._static_paragraph("coefficients_heading"))
             
             coefs = [
                 f"État du bien : {details.get('coefficient_etat', 1.0):.2f}",
@@ -473,8 +667,7 @@ class PDFReportGenerator:
                 f"<b>Coefficient total : {details.get('coefficient_total', 1.0):.3f}</b>"
             ]
             
-            for coef in coefs:
-                elements.append(Paragraph(f"• {coef}", self.styles['BodyText']))
+            elements.append(self._bullet_list(coefs))
         
         elements.append(Spacer(1, 15))
         
@@ -484,10 +677,7 @@ class PDFReportGenerator:
         """Construit la section avertissements."""
         elements = []
         
-        elements.append(Paragraph(
-            "⚠️ Points d'Attention",
-            self.styles['SectionTitle']
-        ))
+        elements.append(self._static_paragraph("section_warnings"))
         
         for warning in estimation.get("avertissements", []):
             elements.append(Paragraph(warning, self.styles['Warning']))
@@ -497,7 +687,7 @@ class PDFReportGenerator:
         return elements
     
     def _build_footer(self, estimation: Dict) -> list:
-        """Construit le pied de page."""
+        """Construit l'avertissement légal de fin de rapport."""
         elements = []
         
         elements.append(HRFlowable(
@@ -508,21 +698,22 @@ class PDFReportGenerator:
             spaceAfter=10
         ))
         
-        disclaimer = """
-        <b>Avertissement légal :</b> Cette estimation est fournie à titre indicatif uniquement 
-        et ne constitue pas une évaluation officielle. Les valeurs réelles peuvent varier 
-        significativement en fonction de facteurs non pris en compte dans cette analyse 
-        (état intérieur détaillé, travaux récents, spécificités locales, etc.). 
-        Pour une évaluation précise, consultez un expert immobilier agréé.
-        """
-        
-        elements.append(Paragraph(disclaimer, self.styles['SmallText']))
-        
-        elements.append(Spacer(1, 10))
-        
-        elements.append(Paragraph(
-            f"Rapport généré par EstimImmo AI - {datetime.now().strftime('%d/%m/%Y %H:%M')}",
-            self.styles['SmallText']
-        ))
+        elements.append(self._static_paragraph("disclaimer"))
         
         return elements
+
+
+# Générateur propre à chaque worker du pool de generate_async
+_worker_generator: Optional[PDFReportGenerator] = None
+
+
+def _warm_worker():
+    """Initialise un worker: imports reportlab, styles et un rapport à blanc."""
+    global _worker_generator
+    _worker_generator = PDFReportGenerator()
+    _worker_generator.generate_bytes({})
+
+
+def _build_in_worker(estimation: Dict[str, Any], now: datetime) -> bytes:
+    """Construit un rapport dans un worker et retourne son contenu."""
+    return _worker_generator._build_pdf(estimation, now).getvalue()
@@ -0,0 +1,113 @@
+"""
+Tests du service DVF (statistiques de prix, réponses HTTP simulées)
+"""
+
+import asyncio
+import statistics
+from datetime import datetime, timedelta
+
+import numpy as np
+import orjson
+import pytest
+
+from services.dvf import DVFService
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status_code = 200
+        self.content = orjson.dumps(data)
+
+
+class FakeClient:
+    """Client HTTP simulé: CQuest renvoie les transactions fournies."""
+    
+    def __init__(self, transactions):
+        self.transactions = transactions
+    
+    async def get(self, url, **kwargs):
+        if url == DVFService.DVF_CQUEST_URL:
+            return FakeResponse({"features": [{"properties": t} for t in self.transactions]})
+        return FakeResponse([])
+    
+    async def aclose(self):
+        pass
+
+
+def _reference_stats(transactions):
+    """Calcul d'origine (module statistics), lignes invalides écartées."""
+    prix_m2_list = []
+    detail = []
+    for t in transactions:
+        prix = t.get("valeur_fonciere") or t.get("prix")
+        surface = t.get("surface_reelle_bati") or t.get("surface_bati") or t.get("surface")
+        if not (isinstance(prix, (int, float)) and isinstance(surface, (int, float))):
+            continue
+        if prix and surface and surface > 10:
+            prix_m2 = prix / surface
+            if 500 <= prix_m2 <= 20000:
+                prix_m2_list.append(prix_m2)
+                detail.append((t.get("date_mutation"), prix, surface, round(prix_m2, 2)))
+    
+    return {
+        "prix_m2_moyen": round(statistics.mean(prix_m2_list), 2),
+        "prix_m2_median": round(statistics.median(prix_m2_list), 2),
+        "prix_m2_min": round(min(prix_m2_list), 2),
+        "prix_m2_max": round(max(prix_m2_list), 2),
+        "ecart_type": round(statistics.stdev(prix_m2_list), 2) if len(prix_m2_list) > 1 else 0,
+        "nb_transactions": len(prix_m2_list),
+        "detail": detail[:10],
+    }
+
+
+def _transactions(seed: int, count: int):
+    """Transactions récentes aléatoires, dont des lignes invalides ou incohérentes."""
+    rng = np.random.default_rng(seed)
+    today = datetime.now()
+    transactions = []
+    for i in range(count):
+        kind = rng.integers(0, 8)
+        surface = float(rng.uniform(5, 200)) if kind != 1 else int(rng.integers(11, 150))
+        prix = float(rng.uniform(10_000, 1_500_000))
+        t = {
+            "date_mutation": (today - timedelta(days=int(rng.integers(1, 300)))).strftime("%Y-%m-%d"),
+            "type_local": "Appartement",
+            "adresse": f"{i} rue Test",
+        }
+        if kind == 2:
+            t["valeur_fonciere"] = str(round(prix))  # chaîne numérique: écartée
+            t["surface_reelle_bati"] = surface
+        elif kind == 3:
+            t["prix"] = prix
+            t["surface"] = "45"  # chaîne numérique: écartée
+        elif kind == 4:
+            t["valeur_fonciere"] = None
+            t["surface_reelle_bati"] = surface
+        elif kind == 5:
+            t["prix"] = prix
+            t["surface_bati"] = float(rng.uniform(1, 10))  # surface trop petite
+        else:
+            t["valeur_fonciere"] = prix
+            t["surface_reelle_bati"] = surface
+        transactions.append(t)
+    return transactions
+
+
+@pytest.mark.parametrize("seed,count", [(0, 5), (1, 40), (2, 200)])
+def test_stats_match_statistics_reference(seed, count, tmp_path):
+    transactions = _transactions(seed, count)
+    expected = _reference_stats(transactions)
+    
+    service = DVFService(client=FakeClient(transactions), cache_dir=str(tmp_path))
+    try:
+        result = asyncio.run(service.get_stats(48.86, 2.34))
+    finally:
+        asyncio.run(service.close())
+    
+    assert result["source"] == "DVF Etalab"
+    assert result["nb_transactions"] == expected["nb_transactions"]
+    for key in ("prix_m2_moyen", "prix_m2_median", "prix_m2_min", "prix_m2_max", "ecart_type"):
+        assert result[key] == pytest.approx(expected[key], abs=0.011), key
+    assert [
+        (d["date"], d["prix"], d["surface"], d["prix_m2"]) for d in result["transactions_detail"]
+    ] == expected["detail"]
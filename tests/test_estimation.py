@@ -0,0 +1,35 @@
+"""
+Tests du moteur d'estimation
+"""
+
+from services.estimation import EstimationEngine
+
+
+CADASTRE = {"surface_terrain": 500}
+DVF = {"prix_m2_moyen": 4000, "nb_transactions": 5}
+
+
+def test_float_floor_count():
+    """Un nombre d'étages flottant (2.0) donne le même coefficient que l'entier."""
+    engine = EstimationEngine()
+    for etages in (2, 2.0):
+        vision = {"type_bien": "maison", "nombre_etages_estime": etages}
+        result = engine.calculate(cadastre=CADASTRE, dvf=DVF, vision=vision, dpe=None)
+        assert result["details_calcul"]["coefficient_etages"] == 1.05
+
+
+def test_dpe_coefficient_strict_classes():
+    """Seules les classes DPE exactes (A à G) modifient le prix."""
+    assert EstimationEngine._get_dpe_coefficient("F") == 0.88
+    for classe in ("f", "FG", "Z", "", None):
+        assert EstimationEngine._get_dpe_coefficient(classe) == 1.0
+
+
+def test_margin_cache_buckets_confidence():
+    """Les confiances proches partagent une entrée du cache des marges."""
+    engine = EstimationEngine()
+    EstimationEngine._calculate_margin.cache_clear()
+    for confidence in (72.001, 72.002, 72.0031):
+        vision = {"type_bien": "maison", "score_confiance": confidence}
+        engine.calculate(cadastre=CADASTRE, dvf=DVF, vision=vision, dpe=None)
+    assert EstimationEngine._calculate_margin.cache_info().currsize == 1
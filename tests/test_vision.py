@@ -0,0 +1,156 @@
+"""
+Tests du service Vision (mode heuristique)
+"""
+
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from services import vision
+from services.vision import VisionAnalyzer
+
+
+@pytest.fixture
+def gray():
+    """Image en niveaux de gris fixe: bruit + damier + dégradé."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:120, 0:160]
+    checker = ((x // 8 + y // 8) % 2) * 120
+    ramp = x // 2
+    noise = rng.integers(0, 40, (120, 160))
+    return np.ascontiguousarray(np.clip(checker + ramp + noise, 0, 255).astype(np.uint8))
+
+
+def _texture_numpy(gray, monkeypatch):
+    monkeypatch.setattr(vision, "cv2", None)
+    monkeypatch.setattr(vision, "_texture_kernel", None)
+    return VisionAnalyzer()._analyze_texture(gray)
+
+
+def test_texture_numpy_reference(gray, monkeypatch):
+    """Le repli NumPy mesure la différence moyenne entre pixels voisins."""
+    g = gray.astype(np.int64)
+    expected = (np.abs(np.diff(g, axis=1)).mean() + np.abs(np.diff(g, axis=0)).mean()) / 2
+    assert _texture_numpy(gray, monkeypatch) == pytest.approx(expected)
+
+
+@pytest.mark.skipif(vision.cv2 is None, reason="OpenCV non installé")
+def test_texture_opencv_matches_numpy(gray, monkeypatch):
+    score = VisionAnalyzer()._analyze_texture(gray)
+    assert score == pytest.approx(_texture_numpy(gray, monkeypatch))
+
+
+@pytest.mark.skipif(vision._texture_kernel is None, reason="Numba non installé")
+def test_texture_numba_matches_numpy(gray, monkeypatch):
+    score = vision._texture_kernel(gray)
+    assert score == pytest.approx(_texture_numpy(gray, monkeypatch))
+
+
+def _facade_png(width: int, height: int, floors: int, noise: float) -> bytes:
+    """Façade synthétique (PNG): rangées de fenêtres sombres sur enduit clair, avec grain."""
+    rng = np.random.default_rng(1)
+    pixels = np.full((height, width, 3), (190, 170, 150), dtype=float)
+    floor_height = height // floors
+    for floor in range(floors):
+        y0 = floor * floor_height + floor_height // 4
+        for x0 in range(width // 10, width - width // 10, width // 5):
+            pixels[y0:y0 + floor_height // 3, x0:x0 + width // 10] = (60, 70, 90)
+    pixels += rng.normal(0, noise, pixels.shape)
+    
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+# Résultats de l'implémentation d'origine (float64, sans réduction) sur des
+# images déjà plus petites que ANALYSIS_SIZE:
+# (type_bien, etat_exterieur, étages, confiance, lignes détectées)
+BASELINE_RESULTS = [
+    ((300, 500, 6, 12), ("maison", "bon", 2, 60.0, 12)),
+    ((500, 300, 2, 25), ("maison", "bon", 1, 70.0, 4)),
+    ((256, 480, 8, 5), ("immeuble", "bon", 2, 60.0, 16)),
+    ((400, 400, 3, 40), ("maison", "bon", 2, 70.0, 6)),
+]
+
+
+@pytest.mark.parametrize("params,expected", BASELINE_RESULTS)
+def test_heuristic_matches_baseline(params, expected):
+    result = VisionAnalyzer()._analyze_sync(_facade_png(*params))
+    assert (
+        result["type_bien"],
+        result["etat_exterieur"],
+        result["nombre_etages_estime"],
+        result["score_confiance"],
+        result["details"]["lignes_detectees"],
+    ) == expected
+
+
+def _record_rgb_drafts(monkeypatch, image_class) -> list:
+    """Enregistre les appels draft('RGB', ...) sur une classe d'image Pillow."""
+    calls = []
+    original = image_class.draft
+    
+    def draft(self, mode, size):
+        if mode == "RGB":
+            calls.append((self.format, size))
+        return original(self, mode, size)
+    
+    monkeypatch.setattr(image_class, "draft", draft)
+    return calls
+
+
+def test_jpeg_decoded_at_analysis_size(monkeypatch):
+    from PIL import JpegImagePlugin
+    calls = _record_rgb_drafts(monkeypatch, JpegImagePlugin.JpegImageFile)
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (2000, 1500), (190, 170, 150)).save(buffer, "JPEG")
+    result = VisionAnalyzer()._analyze_sync(buffer.getvalue())
+    
+    assert calls == [("JPEG", VisionAnalyzer.ANALYSIS_SIZE)]
+    assert result["details"]["resolution_image"] == "2000x1500"
+
+
+def test_png_not_drafted(monkeypatch):
+    calls = _record_rgb_drafts(monkeypatch, Image.Image)
+    
+    buffer = io.BytesIO()
+    Image.new("P", (800, 600)).save(buffer, "PNG")
+    result = VisionAnalyzer()._analyze_sync(buffer.getvalue())
+    
+    assert calls == []
+    assert result["details"]["methode"] == "heuristic"
+
+
+def test_cached_analysis_not_shared():
+    """Modifier un résultat ne modifie pas l'analyse en cache."""
+    analyzer = VisionAnalyzer()
+    photo = _facade_png(300, 500, 6, 12)
+    
+    first = asyncio.run(analyzer.analyze(photo))
+    first["details"]["methode"] = "modifie"
+    first["details"]["couleurs_dominantes"].clear()
+    
+    second = asyncio.run(analyzer.analyze(photo))
+    assert second["details"]["methode"] == "heuristic"
+    assert second["details"]["couleurs_dominantes"]
+    
+    second["details"]["score_texture"] = -1
+    assert asyncio.run(analyzer.analyze(photo))["details"]["score_texture"] >= 0
+
+
+def test_analyze_across_event_loops(monkeypatch):
+    """Les analyses fonctionnent dans des boucles successives (sémaphore par boucle)."""
+    monkeypatch.setattr(vision, "_MAX_PENDING", 1)
+    photos = [_facade_png(300, 500, floors, 12) for floors in (2, 3, 4)]
+    
+    async def analyze_all():
+        analyzer = VisionAnalyzer()
+        return await asyncio.gather(*(analyzer.analyze(photo) for photo in photos))
+    
+    for _ in range(2):
+        results = asyncio.run(analyze_all())
+        assert [r["details"]["methode"] for r in results] == ["heuristic"] * 3